@@ -2,6 +2,10 @@ import csv
 import datetime
 import os
 import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
 from clock.config import OUTFILE_PATH
@@ -135,11 +139,265 @@ class FakeClockData:
                     ci.create_clock_in()
 
 
-def main():
+class BulkFakeClockData:
+    """
+    A batch version of FakeClockData. Rather than creating a ClockIn object for every shift,
+    which prints and re-opens the output file each time, this draws every employee/day/shift at
+    once as NumPy arrays and writes the .csv in large blocks.
+
+    The distribution is the same as FakeClockData: 0-3 shifts per day clustered around 6, 11,
+    and 16, a start time +/- 2 hours of the cluster, and a length of 1 minute to 3:59, so nobody
+    ever stays over midnight.
+
+    Employees are generated in fixed-size blocks and every block gets its own random generator
+    seeded from (seed, block number). This means that the output for a given seed doesn't
+    depend on how the blocks are grouped together, which keeps the door open to generating
+    blocks in parallel.
+    """
+    CLUSTERS = np.array([6, 11, 16])
+    BLOCK_SIZE = 1000
+
+    def __init__(self, seed=None, employees=None, start_date="2019-01-01", end_date="2019-12-31"):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.employees = employees
+        self.start_date = start_date
+        self.end_date = end_date
+        self.date_list = []
+        self.date_prefixes = None
+        self.minute_suffixes = None
+
+    def generate_random_data(self, outfile_path=OUTFILE_PATH):
+        """
+        The primary method that you'd call as an end-user. Mirrors
+        FakeClockData.generate_random_data, but writes every block to the file as it goes.
+
+        :param outfile_path: The .csv file to write to.
+        :return: The number of rows written.
+        :rtype: int
+        """
+        self.generate_employee_ids()
+        self.generate_date_list()
+        return self.write_blocks(range(self.block_count()), outfile_path)
+
+    def generate_employee_ids(self):
+        """
+        If the number of employees wasn't specified, pick one the same way FakeClockData does,
+        but from the seeded generator so that it is reproducible.
+
+        :return: None
+        """
+        if self.employees is None:
+            self.employees = int(np.random.default_rng(self.seed).integers(100, 501))
+
+    def generate_date_list(self):
+        """
+        Generate the list of dates along with the formatting we need for the output. Dates and
+        times are formatted once up front, as a matrix of bytes with one row per day
+        ("2019-01-01 ") and one per minute of the day ("08:00:00\n"), so that writing a row is
+        only a matter of copying bytes out of them.
+
+        :return: None
+        """
+        self.date_list = pd.date_range(self.start_date, self.end_date)
+        self.date_prefixes = _byte_matrix(self.date_list.strftime("%Y-%m-%d ").tolist())
+        self.minute_suffixes = _byte_matrix(
+            [f"{m // 60:02d}:{m % 60:02d}:00\n" for m in range(24 * 60)]
+        )
+
+    def block_count(self):
+        return -(-self.employees // self.BLOCK_SIZE)
+
+    def generate_block(self, block):
+        """
+        Generate every clock in/out for one block of employees. Each employee/day gets a random
+        number of shifts and each shift gets a random start and length, all drawn as arrays.
+        Rows come out in the same order FakeClockData writes them: by employee, by date,
+        by shift, with each clock in immediately followed by its clock out.
+
+        :param block: The block number; employees block * BLOCK_SIZE up to the next block.
+        :return: Arrays of employee ids, date indexes and minute-of-day for each row.
+        :rtype: tuple
+        """
+        first_employee = block * self.BLOCK_SIZE
+        last_employee = min(first_employee + self.BLOCK_SIZE, self.employees)
+        shape = (last_employee - first_employee, len(self.date_list), len(self.CLUSTERS))
+
+        rng = np.random.default_rng([self.seed, block])
+        daily_clock_ins = rng.integers(0, 4, size=shape[:2])
+        rand_hour = self.CLUSTERS + rng.integers(-2, 3, size=shape)
+        rand_minute = rng.integers(0, 60, size=shape)
+        delta = rng.integers(0, 4, size=shape) * 60 + rng.integers(1, 60, size=shape)
+
+        clock_in_minute = rand_hour * 60 + rand_minute
+        clock_out_minute = clock_in_minute + delta
+
+        employee_index, date_index, shift = np.nonzero(
+            np.arange(len(self.CLUSTERS)) < daily_clock_ins[..., None]
+        )
+        minutes = np.column_stack(
+            [
+                clock_in_minute[employee_index, date_index, shift],
+                clock_out_minute[employee_index, date_index, shift],
+            ]
+        ).ravel()
+
+        return (
+            np.repeat(employee_index + first_employee, 2),
+            np.repeat(date_index, 2),
+            minutes,
+        )
+
+    def format_block(self, block):
+        """
+        Turn a block into the bytes that are written to the file, in the same format as
+        ClockIn.write_to_file.
+
+        Every row is built in place in a matrix of bytes, one row of the matrix per row of the
+        file, so no string is ever made for a row. The rows of employee ids with the same number
+        of digits are all the same length, and a block is sorted by employee id, so the block is
+        split wherever the number of digits goes up and each part gets a matrix of its own:
+
+            employee id digits | "," | date prefix | minute suffix
+
+        :param block: The block number to generate.
+        :return: The bytes for every row in the block and the number of rows.
+        :rtype: tuple
+        """
+        employee_ids, date_index, minutes = self.generate_block(block)
+        date_width = self.date_prefixes.shape[1]
+        minute_width = self.minute_suffixes.shape[1]
+        parts = []
+        start = 0
+        for digits in range(1, len(str(max(self.employees - 1, 0))) + 1):
+            end = int(np.searchsorted(employee_ids, 10 ** digits))
+            if end > start:
+                date_start = digits + 1
+                minute_start = date_start + date_width
+                rows = np.empty((end - start, minute_start + minute_width), dtype=np.uint8)
+                powers = 10 ** np.arange(digits - 1, -1, -1)
+                rows[:, :digits] = employee_ids[start:end, None] // powers % 10 + ord("0")
+                rows[:, digits] = ord(",")
+                rows[:, date_start:minute_start] = self.date_prefixes[date_index[start:end]]
+                rows[:, minute_start:] = self.minute_suffixes[minutes[start:end]]
+                parts.append(rows.tobytes())
+            start = end
+        return b"".join(parts), len(employee_ids)
+
+    def write_blocks(self, blocks, outfile_path):
+        """
+        Write a sequence of blocks to a file. Each block is written with a single call into a
+        large buffer, rather than a write (and file open) per row.
+
+        :param blocks: An iterable of block numbers.
+        :param outfile_path: The .csv file to write to.
+        :return: The number of rows written.
+        :rtype: int
+        """
+        total_rows = 0
+        with open(outfile_path, "wb", buffering=2 ** 22) as csv_file:
+            for block in blocks:
+                data, rows = self.format_block(block)
+                csv_file.write(data)
+                total_rows += rows
+                print(
+                    f"...generated block {block + 1}/{self.block_count()} "
+                    f"({total_rows} rows). {datetime.datetime.utcnow()}"
+                )
+        return total_rows
+
+    def generate_in_parallel(self, workers=None, merge=True, outfile_path=OUTFILE_PATH):
+        """
+        Split the employee blocks into contiguous shards and generate each shard in its own
+        process, writing to its own shard file next to outfile_path. Because every block is
+        seeded from (seed, block), a shard's data only depends on which blocks it holds, so the
+        merged file is identical no matter how many workers are used.
+
+        :param workers: Number of processes to use. Defaults to the number of CPUs.
+        :param merge: Concatenate the shards, in order, into outfile_path and remove them.
+        :param outfile_path: The .csv file to write to.
+        :return: The paths of the shard files (or just outfile_path if merged).
+        :rtype: list
+        """
+        self.generate_employee_ids()
+        # With no employees there are no blocks, but there's still one (empty) shard to write.
+        workers = max(1, min(workers or os.cpu_count(), self.block_count()))
+        shards = np.array_split(np.arange(self.block_count()), workers)
+        base, extension = os.path.splitext(outfile_path)
+        shard_paths = [f"{base}.shard_{i:03d}{extension}" for i in range(len(shards))]
+
+        print(f"...generating {len(shards)} shards. {datetime.datetime.utcnow()}")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _generate_shard,
+                    self.seed,
+                    self.employees,
+                    self.start_date,
+                    self.end_date,
+                    shard.tolist(),
+                    shard_path,
+                )
+                for shard, shard_path in zip(shards, shard_paths)
+            ]
+            total_rows = sum(future.result() for future in futures)
+        print(f"...generated {total_rows} rows. {datetime.datetime.utcnow()}")
+
+        if not merge:
+            return shard_paths
+
+        print(f"...merging shards into {outfile_path}. {datetime.datetime.utcnow()}")
+        with open(outfile_path, "wb") as outfile:
+            for shard_path in shard_paths:
+                with open(shard_path, "rb") as shard_file:
+                    shutil.copyfileobj(shard_file, outfile, 2 ** 24)
+                os.unlink(shard_path)
+        return [outfile_path]
+
+
+def _byte_matrix(strings):
+    """
+    :param strings: ASCII strings that are all the same length.
+    :return: A matrix of their bytes, with one row per string.
+    :rtype: np.ndarray
+    """
+    width = len(strings[0]) if strings else 0
+    return np.frombuffer("".join(strings).encode("ascii"), dtype=np.uint8).reshape(
+        len(strings), width
+    )
+
+
+def _generate_shard(seed, employees, start_date, end_date, blocks, shard_path):
+    """
+    Worker for BulkFakeClockData.generate_in_parallel. This has to live at the module level so
+    that it can be pickled and sent to the process pool.
+
+    :return: The number of rows written to the shard.
+    :rtype: int
+    """
+    fcd = BulkFakeClockData(
+        seed=seed, employees=employees, start_date=start_date, end_date=end_date
+    )
+    fcd.generate_date_list()
+    return fcd.write_blocks(blocks, shard_path)
+
+
+def main(bulk=False, seed=None, employees=None, workers=None):
     """
     Generate fake data to file.
+
+    :param bulk: Use BulkFakeClockData rather than generating a row at a time.
+    :param seed: Seed for the bulk generator, so the output can be reproduced.
+    :param employees: Number of employees for the bulk generator. Random if not given.
+    :param workers: If given, generate the bulk data in this many processes.
     :return: None
     """
     clean_file()
-    fcd = FakeClockData()
+    if bulk and workers:
+        BulkFakeClockData(seed=seed, employees=employees).generate_in_parallel(workers=workers)
+        return
+
+    if bulk:
+        fcd = BulkFakeClockData(seed=seed, employees=employees)
+    else:
+        fcd = FakeClockData()
     fcd.generate_random_data()
@@ -3,68 +3,142 @@ import pandas as pd
 
 from clock.config import connect, OUTFILE_PATH
 from clock import clock_models
+from clock.instrumentation import current_span, timed
+from clock.staging_loader import StagingLoader, dataframe_batches
 
 
 class ImportFile:
-    def __init__(self, engine, session):
+    def __init__(self, engine, session, chunk_size=None):
+        """
+        :param engine: A SQLAlchemy engine
+        :param session: A SQLAlchemy session object
+        :param chunk_size: If given, stream the file into the staging table this many rows at a
+            time rather than reading the whole thing into memory.
+        """
         self.engine = engine
         self.session = session
+        self.chunk_size = chunk_size
+        self.df = None
+        self.row_count = 0
+        self.checksum = 0
 
     def execute(self):
-        self.read_file()
-        self.insert_to_staging_table()
+        if self.chunk_size:
+            self.stream_file_to_staging_table()
+        else:
+            self.read_file()
+            self.insert_to_staging_table()
         self.check_row_counts()
 
+    @timed
     def read_file(self):
         """
         Read the file in as a dataframe. No attempt made to split into chunks because, presumably,
         this file will always fit into memory. If this is not the case, all that is required is
         splitting the file into chunks when we read, which in Python turns it into a generator.
         We can then truncate the staging table on each execution and then append each of the
-        chunks to it.
+        chunks to it, which is what stream_file_to_staging_table does if a chunk_size is given.
 
         :return: None
         """
         print(f"...reading {OUTFILE_PATH} into dataframe. {datetime.datetime.utcnow()}")
         self.df = pd.read_csv(OUTFILE_PATH, header=None)
+        self.df.columns = ["employee_id", "clock_time"]
+        self.row_count, self.checksum = self.summarize_rows(self.df)
+        current_span()["rows"] = self.row_count
 
+    @timed
     def insert_to_staging_table(self):
         """
-        Drop the staging table and then insert the new data into the staging table.
+        Drop the staging table and then insert the new data into the staging table. The actual
+        loading is done by the StagingLoader, which goes straight to SQLite rather than through
+        DataFrame.to_sql.
 
-        :return:
+        :return: None
         """
-        print(f"...truncating clock_staging. {datetime.datetime.utcnow()}")
-        self.session.execute("DROP TABLE IF EXISTS clock_staging;")
-        self.session.commit()
-
         print(f"...inserting into clock_staging. {datetime.datetime.utcnow()}")
-        self.df.columns = ["employee_id", "clock_time"]
-        self.df.to_sql("clock_staging", con=self.engine)
-        self.session.commit()
+        current_span()["rows"] = StagingLoader(self.engine).load(dataframe_batches(self.df))
+        print(f"...done! {datetime.datetime.utcnow()}")
+
+    @timed
+    def stream_file_to_staging_table(self):
+        """
+        The chunked version of read_file and insert_to_staging_table. The file is read
+        chunk_size rows at a time and each chunk is handed to the StagingLoader as it is read,
+        so only one chunk is ever held in memory. We keep a running row count and checksum as
+        we go so that check_row_counts still works without the dataframe.
+
+        :return: None
+        """
+        print(f"...streaming {OUTFILE_PATH} into clock_staging. {datetime.datetime.utcnow()}")
+        current_span()["rows"] = StagingLoader(self.engine).load(self.read_file_in_chunks())
         print(f"...done! {datetime.datetime.utcnow()}")
 
+    def read_file_in_chunks(self):
+        """
+        Read the file chunk_size rows at a time, updating the running row count and checksum.
+
+        :return: A generator of lists of (employee_id, clock_time) tuples.
+        """
+        self.row_count = 0
+        self.checksum = 0
+        chunks = pd.read_csv(
+            OUTFILE_PATH,
+            header=None,
+            names=["employee_id", "clock_time"],
+            chunksize=self.chunk_size,
+        )
+        for i, chunk in enumerate(chunks):
+            row_count, checksum = self.summarize_rows(chunk)
+            self.row_count += row_count
+            self.checksum += checksum
+            print(f"...read chunk {i} ({self.row_count} rows). {datetime.datetime.utcnow()}")
+            yield list(zip(chunk["employee_id"].tolist(), chunk["clock_time"].tolist()))
+
+    @staticmethod
+    def summarize_rows(df):
+        """
+        Count the rows and build a simple checksum from them: the sum of the employee_ids plus
+        the sum of the clock times as seconds since the epoch. The same numbers can be computed
+        in SQL (see check_row_counts), which lets us compare the file to the staging table
+        without holding the file in memory.
+
+        :param df: A dataframe (or chunk) with employee_id and clock_time columns.
+        :return: The number of rows and the checksum.
+        :rtype: tuple
+        """
+        epochs = pd.to_datetime(df["clock_time"]).astype("int64") // 10 ** 9
+        checksum = int(df["employee_id"].sum()) + int(epochs.sum())
+        return len(df), checksum
+
+    @timed
     def check_row_counts(self):
         """
         Perform a quick sanity check to see if the imported file has the same number of rows as
-        the staging table.
+        the staging table, and that the checksum of the rows matches.
 
         :return: None
         """
-
-        df_len = len(self.df)
-        sql = "select count(*) from clock_staging;"
-        result = self.session.execute(sql).fetchone()[0]
-        if df_len != result:
+        sql = """
+            select count(*)
+                 , coalesce(sum(employee_id), 0) + coalesce(sum(strftime('%s', clock_time)), 0)
+            from clock_staging;
+        """
+        row_count, checksum = self.session.execute(sql).fetchone()
+        if self.row_count != row_count:
             raise ValueError(
                 "Count of Staging Table (clock_staging) does not match the CSV file!"
             )
+        if self.checksum != checksum:
+            raise ValueError(
+                "Checksum of Staging Table (clock_staging) does not match the CSV file!"
+            )
 
 
-def main():
+def main(chunk_size=None):
     print("Importing Clock Data...")
     engine, session = connect()
     clock_models.create_models(engine=engine, session=session)
 
-    i = ImportFile(engine=engine, session=session)
+    i = ImportFile(engine=engine, session=session, chunk_size=chunk_size)
     i.execute()
@@ -0,0 +1,222 @@
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak memory just won't be reported there.
+    resource = None
+
+STAGES = ("generate", "import", "validate", "transform")
+DEFAULT_SCALES = (100, 1000, 10000)
+START_DATE = "2019-01-01"
+
+# A stage is reported as a regression if it takes this much longer than the baseline.
+REGRESSION_THRESHOLD = 0.20
+
+
+def peak_rss_bytes():
+    """
+    The peak resident memory of this process. Linux reports this in kilobytes and macOS in bytes.
+
+    :return: Peak RSS in bytes, or None if it can't be measured on this platform.
+    :rtype: int
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_stage(stage, employees, years, seed):
+    """
+    Run a single stage of the pipeline and time it. This is run in a fresh process for every
+    stage (see run_scale) so that the peak memory belongs to that stage alone. The file and
+    database paths come from the environment, which is why the clock modules are imported here
+    rather than at the top of the file.
+
+    :param stage: One of STAGES
+    :param employees: The number of employees to generate.
+    :param years: The number of years of clock data to generate.
+    :param seed: The seed for the generator.
+    :return: The timing of the stage.
+    :rtype: dict
+    """
+    import pandas as pd
+    from clock import clock_models
+    from clock.a_fake_clock_data import BulkFakeClockData
+    from clock.b_import_clock_data import ImportFile
+    from clock.c_transform_clock_data import Transform
+    from clock.config import connect, OUTFILE_PATH
+    from clock.validate_clock_data import ValidateStaging
+
+    start = time.perf_counter()
+    if stage == "generate":
+        end_date = pd.Timestamp(START_DATE) + pd.DateOffset(years=years) - pd.Timedelta(days=1)
+        rows = BulkFakeClockData(
+            seed=seed, employees=employees, start_date=START_DATE, end_date=end_date
+        ).generate_random_data(OUTFILE_PATH)
+    else:
+        engine, session = connect()
+        clock_models.create_models(engine=engine, session=session)
+        if stage == "import":
+            importer = ImportFile(engine=engine, session=session)
+            importer.execute()
+            rows = importer.row_count
+        elif stage == "validate":
+            validator = ValidateStaging(engine, session)
+            validator.execute()
+            rows = len(validator.df)
+        else:
+            Transform(engine, session).execute()
+            rows = session.execute("select count(*) from clock_staging;").fetchone()[0]
+    seconds = time.perf_counter() - start
+
+    return {
+        "stage": stage,
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def run_scale(employees, years, seed, directory, verbose=False):
+    """
+    Run every stage for one scale point, each in its own process, against a file and database
+    in the given directory.
+
+    :return: The results for each stage, including the database size after the stage.
+    :rtype: list
+    """
+    db_path = os.path.join(directory, "clock.db")
+    env = dict(
+        os.environ,
+        CLOCK_OUTFILE_PATH=os.path.join(directory, "time_file.csv"),
+        CLOCK_DB_PATH=db_path,
+    )
+
+    results = []
+    for stage in STAGES:
+        print(f"...benchmarking {stage} for {employees} employees over {years} year(s). "
+              f"{datetime.datetime.utcnow()}")
+        result_path = os.path.join(directory, f"{stage}.json")
+        subprocess.run(
+            [
+                sys.executable, "-m", "clock.benchmark",
+                "--stage", stage,
+                "--employees", str(employees),
+                "--years", str(years),
+                "--seed", str(seed),
+                "--result", result_path,
+            ],
+            env=env,
+            check=True,
+            stdout=None if verbose else subprocess.DEVNULL,
+        )
+        with open(result_path) as f:
+            result = json.load(f)
+
+        result.update(
+            employees=employees,
+            years=years,
+            db_size_bytes=sum(
+                os.path.getsize(path)
+                for path in (db_path, f"{db_path}-wal")
+                if os.path.exists(path)
+            ),
+        )
+        print(f"...{stage} took {result['seconds']:.2f}s "
+              f"({result['rows_per_second']:,.0f} rows/sec)")
+        results.append(result)
+    return results
+
+
+def compare_to_baseline(results, baseline):
+    """
+    Compare the wall time of every stage/scale to a stored baseline and print the difference.
+
+    :param results: The "results" list of a benchmark run.
+    :param baseline: The "results" list of the baseline run.
+    :return: The results that were slower than the baseline by more than REGRESSION_THRESHOLD.
+    :rtype: list
+    """
+    def key(result):
+        return result["employees"], result["years"], result["stage"]
+
+    baseline = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline.get(key(result))
+        if previous is None or not previous["seconds"]:
+            continue
+
+        change = result["seconds"] / previous["seconds"] - 1
+        flag = ""
+        if change > REGRESSION_THRESHOLD:
+            regressions.append(result)
+            flag = "  <-- regression"
+        print(f"{result['stage']:>10} {result['employees']:>8} employees {result['years']}y: "
+              f"{previous['seconds']:8.2f}s -> {result['seconds']:8.2f}s ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the clock ETL (generate, import, validate, transform) at several scales."
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Numbers of employees to benchmark.")
+    parser.add_argument("--years", type=int, default=1, help="Years of clock data per scale.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark.json",
+                        help="Where to write the results as JSON.")
+    parser.add_argument("--baseline", help="A previous --output to compare the results to.")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of each stage.")
+    # Used internally to run a single stage in its own process.
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--employees", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        result = run_stage(args.stage, args.employees, args.years, args.seed)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return
+
+    results = []
+    for employees in args.scales:
+        with tempfile.TemporaryDirectory() as directory:
+            results.extend(run_scale(employees, args.years, args.seed, directory, args.verbose))
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "created_at": datetime.datetime.utcnow().isoformat(),
+                "python_version": sys.version.split()[0],
+                "sqlite_version": sqlite3.sqlite_version,
+                "seed": args.seed,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"...wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f)["results"])
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import datetime
+import random
 from faker import Faker
+from sqlalchemy import text
 
 from clock.config import connect
 from clock import clock_models as cm
 from clock.clock_models import execute_sql_file
+from clock.instrumentation import timed
+from clock.sessionize import Sessionize
+from clock.sharded_transform import ShardedTransform
 
 
 class Transform:
@@ -11,9 +16,34 @@ class Transform:
     The transform class is takes data that we imported from the CSV and inserts it into the
     destination tables.
     """
-    def __init__(self, engine, session):
+    # "pandas" only takes whole days: it refuses a staged day that is already partly stored (see
+    # Sessionize.check_whole_days) and doesn't do a full refresh.
+    METHODS = ("sql", "pandas", "sharded")
+    NAME_POOL_SIZE = 1000
+    NAME_BATCH_SIZE = 10000
+
+    def __init__(self, engine, session, full_refresh=False, method="sql", workers=None):
+        """
+        :param engine: A SQLAlchemy engine
+        :param session: A SQLAlchemy session object
+        :param full_refresh: Recompute the daily report for every employee/day rather than only
+            the ones in the staging table.
+        :param method: How to build the clock_ins and daily report; "sql" runs
+            insert_clock_times.sql, "pandas" runs the in-memory Sessionize engine, and
+            "sharded" runs insert_clock_times.sql on shards of the employees in parallel.
+        :param workers: The number of shards/processes for the sharded method. Defaults to the
+            number of CPUs.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"method must be one of {self.METHODS}, not {method!r}")
+        if full_refresh and method == "pandas":
+            raise ValueError("A full refresh is not supported by the pandas method.")
+
         self.engine = engine
         self.session = session
+        self.full_refresh = full_refresh
+        self.method = method
+        self.workers = workers
 
     def execute(self):
         """
@@ -26,38 +56,85 @@ class Transform:
         self.import_clock_times()
         self.run_report_queries()
 
+    @timed
     def import_employees(self):
         """
         Does an insert by invoking the insert_employees.sql file located in clock.sql.  Note that
         this can be ran without error even if it has already been executed. After we have the
-        all of the employee_ids imported, we add fake names to them. If they've already been
-        imported, it'll rename every person.
+        all of the employee_ids imported, we add fake names to the ones that don't have a name
+        yet; anyone who was named on a previous run keeps their name.
 
-        :return:
+        Calling Faker for every employee is slow, so we build a pool of names once and draw from
+        it. The names are applied with one executemany UPDATE (and one commit) per batch rather
+        than a merge and commit per employee.
+
+        :return: None
         """
         print(f"...importing employees. {datetime.datetime.utcnow()}")
         execute_sql_file('insert_employees.sql', self.session)
 
-        faker = Faker()
-        for i, employee in enumerate(self.session.query(cm.Employee)):
-            print(f"...adding fake name for employee: {i}")
+        unnamed = [
+            row[0]
+            for row in self.session.query(cm.Employee.employee_id).filter(
+                cm.Employee.employee_first_name.is_(None)
+            )
+        ]
+        print(f"...adding fake names for {len(unnamed)} employees. {datetime.datetime.utcnow()}")
+        if not unnamed:
+            return
 
-            employee.employee_first_name = faker.first_name()
-            employee.employee_last_name = faker.last_name()
-            self.session.merge(employee)
+        faker = Faker()
+        first_names = [faker.first_name() for _ in range(self.NAME_POOL_SIZE)]
+        last_names = [faker.last_name() for _ in range(self.NAME_POOL_SIZE)]
+
+        sql = text(
+            "update employee "
+            "set employee_first_name = :first_name, employee_last_name = :last_name "
+            "where employee_id = :employee_id;"
+        )
+        for start in range(0, len(unnamed), self.NAME_BATCH_SIZE):
+            batch = unnamed[start:start + self.NAME_BATCH_SIZE]
+            names = zip(random.choices(first_names, k=len(batch)),
+                        random.choices(last_names, k=len(batch)))
+            self.session.execute(
+                sql,
+                [
+                    {"employee_id": employee_id, "first_name": first, "last_name": last}
+                    for employee_id, (first, last) in zip(batch, names)
+                ],
+            )
             self.session.commit()
 
-
+    @timed
     def import_clock_times(self):
         """
         Runs the SQL query that pulls in the clock times from the staging table to the
-        destination table.
+        destination table. Only the employee/days in the staging table are recomputed, unless
+        this is a full refresh, in which case every employee/day is marked dirty first.
+
+        If the method is "pandas", the same tables are built in memory by Sessionize instead. If
+        it is "sharded", the SQL is run by ShardedTransform on several processes at once.
 
         :return: None
         """
+        if self.method == "pandas":
+            print(f"...importing clock times in memory. {datetime.datetime.utcnow()}")
+            Sessionize(self.engine).execute()
+            return
+
+        if self.full_refresh:
+            print(f"...marking all partitions dirty. {datetime.datetime.utcnow()}")
+            execute_sql_file('mark_all_partitions_dirty.sql', self.session)
+
+        if self.method == "sharded":
+            print(f"...importing clock times in parallel. {datetime.datetime.utcnow()}")
+            ShardedTransform(self.engine, self.session, workers=self.workers).execute()
+            return
+
         print(f"...importing clock times. {datetime.datetime.utcnow()}")
         execute_sql_file('insert_clock_times.sql', self.session)
 
+    @timed
     def run_report_queries(self):
         """
         These reports are used to determine basic information about the habits of these employees.
@@ -68,15 +145,18 @@ class Transform:
         execute_sql_file('report_queries.sql', self.session)
 
 
-def main():
+def main(full_refresh=False, method="sql", workers=None):
     """
     This function is included to keep clutter out of the Python file that calls it.
 
+    :param full_refresh: Recompute every employee/day rather than just the new ones.
+    :param method: "sql", "pandas", or "sharded"; see Transform.
+    :param workers: The number of processes for the sharded method.
     :return: None
     """
     print("Transforming data from staging area...")
     engine, session = connect()
     cm.create_models(engine=engine, session=session)
 
-    t = Transform(engine, session)
+    t = Transform(engine, session, full_refresh=full_refresh, method=method, workers=workers)
     t.execute()
\ No newline at end of file
@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     INTEGER,
+    REAL,
     TEXT,
     TIMESTAMP,
     ForeignKey,
@@ -8,11 +9,16 @@ from sqlalchemy import (
 )
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
+import functools
+import json
 import os
+import sqlite3
 
 Base = declarative_base()
 
-from clock.config import SQL_PATH
+from clock.config import SQL_PATH, CAPTURE_QUERY_PLANS, QUERY_PLAN_PATH
+from clock.indexes import create_indexes
+from clock.instrumentation import span
 
 
 class Employee(Base):
@@ -23,61 +29,468 @@ class Employee(Base):
     employee_last_name = Column(TEXT)
 
 
+# From clock_ins on, times are integer seconds since 1970-01-01 (UTC) and dates are the number of
+# days since then, which is a time divided by SECONDS_PER_DAY. insert_clock_times.sql converts
+# them from the staging table's text, and clock/reports.py converts them back.
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
 class ClockIns(Base):
     __tablename__ = 'clock_ins'
 
     employee_id = Column(INTEGER, ForeignKey(Employee.employee_id), primary_key=True)
-    report_date = Column(DATE, primary_key=True)
+    report_date = Column(INTEGER, primary_key=True)
     clock_in_number = Column(INTEGER, primary_key=True)
-    clock_time = Column(TIMESTAMP)
+    clock_time = Column(INTEGER)
 
 
 class EmployeeDailyReport(Base):
     __tablename__ = "employee_daily_report"
 
     employee_id = Column(INTEGER, ForeignKey(Employee.employee_id), primary_key=True)
-    report_date = Column(DATE, primary_key=True)
-    start_time = Column(TIMESTAMP)
-    end_time = Column(TIMESTAMP)
+    report_date = Column(INTEGER, primary_key=True)
+    start_time = Column(INTEGER)
+    end_time = Column(INTEGER)
+    total_floor_time_seconds = Column(INTEGER)
+
+
+class DirtyPartition(Base):
+    """
+    The employee/days that have new clock data and need their daily report recomputed. The
+    transform only ever touches the partitions listed here, so the cost of a run follows the
+    size of the new data rather than the size of the history.
+    """
+    __tablename__ = "dirty_partitions"
+
+    employee_id = Column(INTEGER, primary_key=True)
+    report_date = Column(INTEGER, primary_key=True)
+
+
+class ClockQuarantine(Base):
+    """
+    Swipes that failed validation (see clock.validate_clock_data), kept along with the reasons so
+    that they can be looked into and loaded again once they're fixed. A whole employee/day is
+    quarantined at a time, as its report can't be computed without all of its swipes. It's
+    filled from the staging table, so its dates and times are text, the same as in the file.
+    """
+    __tablename__ = "clock_quarantine"
+
+    quarantine_id = Column(INTEGER, primary_key=True, autoincrement=True)
+    employee_id = Column(INTEGER)
+    report_date = Column(DATE)
+    clock_time = Column(TIMESTAMP)
+    reasons = Column(TEXT)
+    quarantined_at = Column(TIMESTAMP)
+
+
+class FollowOffset(Base):
+    """
+    How far follow mode has read into each file. Files are identified by their device and inode
+    rather than their name, so a file that is renamed when it is rotated carries on from where
+    it left off under its new name.
+    """
+    __tablename__ = "follow_offsets"
+
+    file_id = Column(TEXT, primary_key=True)
+    file_path = Column(TEXT)
+    offset = Column(INTEGER)
+    updated_at = Column(TIMESTAMP)
+
+
+# The report tables below are rollups of employee_daily_report that report_queries.sql keeps up
+# to date. Only the employees, weeks, and months that have dirty partitions are changed, by the
+# difference between each dirty day's old and new floor time. Every bucket carries its year
+# (weeks and months are keyed by the day they start on), so that several years of history don't
+# get added together and a report over a date range only has to read the buckets in that range.
+class TotalAnnualFloorTime(Base):
+    __tablename__ = "total_annual_floor_time"
+
+    employee_id = Column(INTEGER, primary_key=True)
+    report_year = Column(INTEGER, primary_key=True)
+    yearly_floor_time = Column(INTEGER)
+    floor_time_days = Column(INTEGER)
+
+
+class BestWorst25(Base):
+    __tablename__ = "best_worst_25"
+
+    employee_id = Column(INTEGER, primary_key=True)
+    report_year = Column(INTEGER, primary_key=True)
+    yearly_floor_time_seconds = Column(INTEGER)
+    yearly_floor_time_hours = Column(INTEGER)
+    rank_best = Column(INTEGER)
+    rank_worst = Column(INTEGER)
+
+
+class Attendance(Base):
+    __tablename__ = "attendance"
+
+    employee_id = Column(INTEGER, primary_key=True)
+    report_year = Column(INTEGER, primary_key=True)
+    total_days = Column(INTEGER)
+
+
+class WeeklyMonthlyTotals(Base):
+    """
+    A copy of every daily report as of the last time the rollups were updated, along with the
+    week and month it falls in. It's where report_queries.sql gets a dirty day's old floor time
+    from, so it has to stay in step with the rollups: it's only ever written along with them.
+    """
+    __tablename__ = "weekly_monthly_totals"
+
+    employee_id = Column(INTEGER, primary_key=True)
+    report_date = Column(INTEGER, primary_key=True)
+    week_start = Column(INTEGER)
+    month_start = Column(INTEGER)
+    start_time = Column(INTEGER)
+    end_time = Column(INTEGER)
+    total_floor_time_seconds = Column(INTEGER)
+
+
+class MonthlyAggregate(Base):
+    __tablename__ = "monthly_aggregate"
+
+    month_start = Column(INTEGER, primary_key=True)
+    average_floor_time_seconds = Column(REAL)
+    total_floor_time_seconds = Column(INTEGER)
+    min_floor_time_seconds = Column(INTEGER)
+    max_floor_time_seconds = Column(INTEGER)
+    floor_time_days = Column(INTEGER)
+
+
+class WeeklyAggregate(Base):
+    __tablename__ = "weekly_aggregate"
+
+    week_start = Column(INTEGER, primary_key=True)
+    average_floor_time_seconds = Column(REAL)
     total_floor_time_seconds = Column(INTEGER)
+    min_floor_time_seconds = Column(INTEGER)
+    max_floor_time_seconds = Column(INTEGER)
+    floor_time_days = Column(INTEGER)
+
+
+REBUILDABLE_TABLES = {
+    model.__tablename__
+    for model in (
+        TotalAnnualFloorTime, BestWorst25, Attendance, WeeklyMonthlyTotals, MonthlyAggregate,
+        WeeklyAggregate
+    )
+}
+
+# The tables that hold data which can't be rebuilt from the report tables, and how to copy each
+# of them from a database from before times and dates were stored as integers (see
+# migrate_outdated_tables). A day is converted with the same arithmetic as a time, so the two
+# always agree.
+MIGRATIONS = {
+    ClockIns.__tablename__: """
+insert into clock_ins (employee_id, report_date, clock_in_number, clock_time)
+select employee_id
+     , cast(strftime('%s', report_date) as integer) / 86400
+     , clock_in_number
+     , cast(strftime('%s', clock_time) as integer)
+from outdated_clock_ins;
+""",
+    EmployeeDailyReport.__tablename__: """
+insert into employee_daily_report
+    (employee_id, report_date, start_time, end_time, total_floor_time_seconds)
+select employee_id
+     , cast(strftime('%s', report_date) as integer) / 86400
+     , cast(strftime('%s', start_time) as integer)
+     , cast(strftime('%s', end_time) as integer)
+     , total_floor_time_seconds
+from outdated_employee_daily_report;
+""",
+    DirtyPartition.__tablename__: """
+insert into dirty_partitions (employee_id, report_date)
+select employee_id
+     , cast(strftime('%s', report_date) as integer) / 86400
+from outdated_dirty_partitions;
+""",
+}
 
 
 def create_models(engine, session):
     print(f"Creating Tables... {datetime.datetime.now()}")
     # Base.metadata.drop_all(engine)
+    outdated = drop_outdated_tables(engine)
+    migrate_outdated_tables(engine)
     Base.metadata.create_all(engine)
+    deduplicate_clock_ins(engine, session)
+    with engine.begin() as connection:
+        for table in (ClockIns, EmployeeDailyReport, WeeklyMonthlyTotals, TotalAnnualFloorTime,
+                      Attendance, ClockQuarantine):
+            create_indexes(connection, table.__tablename__)
+
+    if outdated:
+        # The rollups were dropped, so they have to be rebuilt from the whole history.
+        execute_sql_file('mark_all_partitions_dirty.sql', session)
+
+
+def deduplicate_clock_ins(engine, session):
+    """
+    clock_ins used to identify a swipe by its position in the day, so a database from before it
+    had a unique index on (employee_id, clock_time) can have the same swipe stored twice. The
+    index can't be built until the extras are gone, so this removes them first (see
+    deduplicate_clock_ins.sql). It does nothing once the index exists.
+
+    :param engine: A SQLAlchemy engine
+    :param session: A SQLAlchemy session object
+    :return: None
+    """
+    with engine.connect() as connection:
+        indexed = connection.execute(
+            "select 1 from sqlite_master "
+            "where type = 'index' and name = 'ux_clock_ins_employee_id_clock_time';"
+        ).fetchone()
+    if not indexed:
+        execute_sql_file('deduplicate_clock_ins.sql', session)
+
+
+def drop_outdated_tables(engine):
+    """
+    The report tables used to be rebuilt with "create table as" on every run, so a database from
+    before they were maintained incrementally has them without their keys or stored counts, one
+    from before they were bucketed by year has them keyed by week or month number alone, and one
+    from before dates were stored as integers has them as text. They only hold derived data, so
+    if any of them doesn't match its model, they're all dropped to be recreated by create_all.
+    They're updated by the difference from the old values in weekly_monthly_totals, so rebuilding
+    only some of them would add the whole history to the rest a second time.
+
+    :param engine: A SQLAlchemy engine
+    :return: The names of the tables that were dropped.
+    :rtype: list
+    """
+    dropped = []
+    with engine.begin() as connection:
+        tables = [
+            table for table in Base.metadata.sorted_tables if table.name in REBUILDABLE_TABLES
+        ]
+        if not any(is_outdated(connection, table) for table in tables):
+            return dropped
+        for table in tables:
+            print(f"...dropping outdated table {table.name}. {datetime.datetime.utcnow()}")
+            connection.execute(f"drop table if exists {table.name};")
+            dropped.append(table.name)
+    return dropped
+
+
+def migrate_outdated_tables(engine):
+    """
+    clock_ins, employee_daily_report, and dirty_partitions used to store their dates and times
+    as text. The swipes in clock_ins can't be rebuilt from anything else, so rather than being
+    dropped, an outdated table is renamed, created again from its model, and its rows are
+    copied over converted to integers (see MIGRATIONS). Its indexes go with the old table, and
+    are created again on the new one by create_models. Each table is migrated in one
+    transaction, so a failure leaves it as it was.
+
+    :param engine: A SQLAlchemy engine
+    :return: None
+    """
+    for table in Base.metadata.sorted_tables:
+        if table.name not in MIGRATIONS:
+            continue
+        with engine.begin() as connection:
+            if not is_outdated(connection, table):
+                continue
+            print(f"...migrating outdated table {table.name}. {datetime.datetime.utcnow()}")
+            connection.execute(f"alter table {table.name} rename to outdated_{table.name};")
+            table.create(connection)
+            connection.execute(MIGRATIONS[table.name])
+            connection.execute(f"drop table outdated_{table.name};")
+
+
+def is_outdated(connection, table):
+    """
+    :param connection: A SQLAlchemy connection
+    :param table: A table from Base.metadata.
+    :return: Whether the table exists with columns, keys, or types other than its model's.
+    :rtype: bool
+    """
+    existing = {
+        (row[1], row[2], row[5] > 0)
+        for row in connection.execute(f"PRAGMA table_info({table.name});")
+    }
+    expected = {
+        (column.name, column.type.compile(dialect=connection.dialect), column.primary_key)
+        for column in table.columns
+    }
+    return bool(existing) and existing != expected
+
 
 
 def read_sql_file(file_name):
     """
-    Convenience function.  Not particularly modular in this sample.  Normally, I'd make it a
-    little more portable but in this case I will only ever use it in this directory so it's fine
-    the way it is.  Accepts the name of the file to run and then returns a list of SQL commands
-    from that file.  SQLite doesn't allow multiple commands to be executed simultaneously,
-    or else I'd just execute the file itself.
+    Convenience function.  Accepts the name of the file to run and then returns a list of SQL
+    commands from that file.  SQLite doesn't allow multiple commands to be executed
+    simultaneously, or else I'd just execute the file itself.
+
+    The file is only parsed the first time it is read (or after it changes); after that, the
+    parsed commands come from a cache. See compile_sql_file.
 
     :param file_name: Name of the file to import.
     :return: A list of SQL commands to be executed.
     :rtype: list
     """
     full_path = os.path.abspath(os.path.join(SQL_PATH, file_name))
+    return list(compile_sql_file(full_path, os.path.getmtime(full_path)))
+
+
+@functools.lru_cache(maxsize=None)
+def compile_sql_file(full_path, modified_time):
+    """
+    Reads a SQL file and splits it into its commands with split_sql_script. The modified time
+    is part of the cache key, so an edited file is parsed again rather than served stale.
+
+    :param full_path: The absolute path to the file.
+    :param modified_time: The modified time of the file.
+    :return: The commands in the file.
+    :rtype: tuple
+    """
     with open(full_path, 'r') as f:
-        return f.read().strip().split(';')
+        return tuple(split_sql_script(f.read()))
+
+
+def split_sql_script(script):
+    """
+    Splits a script into its commands. Splitting on every ";" breaks as soon as one shows up in a
+    comment or a string, so this walks the script and only splits on a ";" that is outside of
+    comments, strings, and quoted names. sqlite3.complete_statement has the final say on whether
+    a command is finished, which keeps the body of something like a trigger together. Comments
+    are stripped and empty commands are dropped.
 
+    :param script: The text of a SQL file.
+    :return: A list of SQL commands.
+    :rtype: list
+    """
+    statements = []
+    current = []
+    i = 0
+    while i < len(script):
+        character = script[i]
+        if script.startswith("--", i):
+            end = script.find("\n", i)
+            i = len(script) if end == -1 else end
+            continue
+        if script.startswith("/*", i):
+            end = script.find("*/", i + 2)
+            i = len(script) if end == -1 else end + 2
+            current.append(" ")
+            continue
+        if character in "'\"`[":
+            closing = "]" if character == "[" else character
+            end = i + 1
+            while True:
+                end = script.find(closing, end)
+                if end == -1:
+                    end = len(script)
+                    break
+                # A doubled quote is an escaped quote rather than the end of the string.
+                if closing != "]" and script.startswith(closing * 2, end):
+                    end += 2
+                    continue
+                end += 1
+                break
+            current.append(script[i:end])
+            i = end
+            continue
+
+        current.append(character)
+        i += 1
+        if character == ";" and sqlite3.complete_statement("".join(current)):
+            statements.append("".join(current).strip())
+            current = []
 
-def execute_sql_file(file_name, session):
+    remainder = "".join(current).strip()
+    if remainder:
+        statements.append(remainder)
+    return [statement for statement in statements if statement.strip("; \n\t")]
+
+
+def execute_sql_file(file_name, session, params=None, commit=True):
     """
     Accepts the name of a file and a SQLAlchemy session object.  Calls the read_sql_file
-    functionality, which pulls a text file from the file system, reads it, and returns a list of
-    SQL comands to run. This command then iterates through them and commits at the end,
-    which mimics the functionality of more robust RDBMS solutions.
+    functionality, which returns the (cached) list of SQL commands in the file, and runs them.
+
+    The commands are run on the session's underlying DB-API connection inside of one explicit
+    transaction, which is committed at the end or rolled back if any command fails. This mimics
+    the functionality of more robust RDBMS solutions and skips the ORM overhead for every
+    command. The sqlite3 module keeps the prepared statements, so running the same file again
+    on the same connection doesn't have to prepare them again.
+
+    If CAPTURE_QUERY_PLANS is set, the query plan of each command is recorded just before it
+    runs; see capture_query_plan. Each command is also timed in its own span, along with the
+    number of rows it affected.
 
     :param file_name: Name of the file to execute
     :param session:  A SQLAlchemy session object
+    :param params: Named parameters for the commands, such as {"start_date": "2019-01-01"}.
+        Commands that don't use a parameter ignore it.
+    :param commit: If False, leave the transaction open so that whatever runs next on the
+        session (such as another file) is committed along with these commands.
     :return: None
     """
     sql_list = read_sql_file(file_name)
-    for sql in sql_list:
-        session.execute(sql)
-    session.commit()
+    params = params or {}
+    connection = session.connection().connection
+    cursor = connection.cursor()
+    warnings = 0
+    try:
+        if not connection.in_transaction:
+            cursor.execute("BEGIN")
+        for i, sql in enumerate(sql_list):
+            if CAPTURE_QUERY_PLANS:
+                warnings += len(capture_query_plan(file_name, i, sql, cursor, params))
+            with span("sql_statement", file_name=file_name, statement_number=i) as s:
+                cursor.execute(sql, params)
+                s["rows"] = cursor.rowcount if cursor.rowcount >= 0 else None
+        if commit:
+            with span("commit", file_name=file_name):
+                connection.commit()
+    except Exception:
+        cursor.close()
+        connection.rollback()
+        session.rollback()
+        raise
+    cursor.close()
+    if commit:
+        session.commit()
+
+    if CAPTURE_QUERY_PLANS:
+        print(f"...captured query plans for {file_name} with {warnings} scans/temp B-trees. "
+              f"See {QUERY_PLAN_PATH}")
+
+
+# Plan steps that mean SQLite is reading a whole table or sorting on the fly. These are fine for
+# the small temp tables but worth a second look anywhere else.
+QUERY_PLAN_WARNINGS = ("SCAN", "USE TEMP B-TREE")
+
+
+def capture_query_plan(file_name, statement_number, sql, cursor, params=None):
+    """
+    Runs EXPLAIN QUERY PLAN for a command and appends the plan to the QUERY_PLAN_PATH file as a
+    line of JSON. This has to be done immediately before the command itself is executed, as the
+    plan can depend on temp tables created earlier in the same file. Any full table scans or
+    temp B-trees are flagged as warnings so that they're noticed before they become a problem.
+
+    :param file_name: Name of the file the command came from
+    :param statement_number: Position of the command in the file
+    :param sql: The command
+    :param cursor: A DB-API cursor
+    :param params: Named parameters for the command.
+    :return: The steps of the query plan that were flagged as warnings.
+    :rtype: list
+    """
+    plan = [row[-1] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params or {})]
+    warnings = [step for step in plan if step.lstrip().startswith(QUERY_PLAN_WARNINGS)]
+
+    with open(QUERY_PLAN_PATH, "a") as f:
+        f.write(json.dumps({
+            "captured_at": datetime.datetime.utcnow().isoformat(),
+            "file_name": file_name,
+            "statement_number": statement_number,
+            "sql": sql.strip(),
+            "plan": plan,
+            "warnings": warnings,
+        }) + "\n")
+    return warnings
 
@@ -1,15 +1,93 @@
-from sqlalchemy import create_engine, orm
+from sqlalchemy import create_engine, event, orm, pool
 import os
 
-OUTFILE_PATH = os.path.join(os.curdir, "time_file.csv")
-DB_PATH = os.path.join(os.curdir, "clock.db")
+# The file and database can be pointed elsewhere through the environment, such as by the
+# benchmark, which runs every scale against its own copy.
+OUTFILE_PATH = os.environ.get("CLOCK_OUTFILE_PATH", os.path.join(os.curdir, "time_file.csv"))
+DB_PATH = os.environ.get("CLOCK_DB_PATH", os.path.join(os.curdir, "clock.db"))
 SQL_PATH = os.path.join(os.curdir, "clock/sql")
+QUERY_PLAN_PATH = os.environ.get(
+    "CLOCK_QUERY_PLAN_PATH", os.path.join(os.curdir, "query_plans.jsonl")
+)
+
+# Set CLOCK_CAPTURE_QUERY_PLANS=1 to record the plan of every statement run from the SQL files.
+CAPTURE_QUERY_PLANS = os.environ.get("CLOCK_CAPTURE_QUERY_PLANS", "") not in ("", "0")
+
+# Set CLOCK_INSTRUMENTATION=1 to write the timing of every stage and SQL statement to a JSON-lines
+# log and a Prometheus textfile. See clock.instrumentation.
+INSTRUMENTATION = os.environ.get("CLOCK_INSTRUMENTATION", "") not in ("", "0")
+METRICS_LOG_PATH = os.environ.get(
+    "CLOCK_METRICS_LOG_PATH", os.path.join(os.curdir, "clock_metrics.jsonl")
+)
+PROMETHEUS_PATH = os.environ.get(
+    "CLOCK_PROMETHEUS_PATH", os.path.join(os.curdir, "clock_metrics.prom")
+)
+
+# PRAGMAs applied to every new SQLite connection, chosen with CLOCK_SQLITE_PROFILE.
+#
+# * default leaves SQLite's own settings alone.
+# * safe uses WAL so that the notebook can read while the pipeline writes, but keeps every
+#   commit fully synced to disk.
+# * fast (the default) also relaxes syncing to the end of each WAL checkpoint, gives each
+#   connection a 256MB page cache, keeps temp tables (such as the intermediate tables in
+#   insert_clock_times.sql) in memory, and memory-maps the database file for the report reads.
+SQLITE_PROFILES = {
+    "default": {},
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -262144,
+        "mmap_size": 2 ** 30,
+        "temp_store": "MEMORY",
+    },
+}
+SQLITE_PROFILE = os.environ.get("CLOCK_SQLITE_PROFILE", "fast")
+
+_engine = None
+_Session = None
+
+
+def get_engine():
+    """
+    Returns the engine for DB_PATH, creating it the first time it is called. Everything in the
+    process (each of the stages, the notebook) shares this engine and its pool of connections,
+    so the connections, their page caches, and their prepared statements are reused rather than
+    being thrown away between stages.
+
+    :return: A SQLAlchemy engine
+    """
+    global _engine, _Session
+    if _engine is None:
+        if SQLITE_PROFILE not in SQLITE_PROFILES:
+            raise ValueError(
+                f"CLOCK_SQLITE_PROFILE must be one of {sorted(SQLITE_PROFILES)}, "
+                f"not {SQLITE_PROFILE!r}"
+            )
+        _engine = create_engine(f'sqlite:///{DB_PATH}', poolclass=pool.QueuePool)
+        event.listen(_engine, "connect", _apply_profile)
+        _Session = orm.sessionmaker(autoflush=False, bind=_engine)
+    return _engine
+
+
+def _apply_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PROFILES[SQLITE_PROFILE].items():
+        cursor.execute(f"PRAGMA {name} = {value};")
+    cursor.close()
 
 
 def connect():
-    engine = create_engine(f'sqlite:///{DB_PATH}')
-    Session = orm.sessionmaker(autoflush=False)
-    Session.configure(bind=engine)
-    session = Session()
+    """
+    Returns the shared engine along with a new session bound to it.
+
+    :return: A SQLAlchemy engine and session
+    :rtype: tuple
+    """
+    engine = get_engine()
+    session = _Session()
 
     return engine, session
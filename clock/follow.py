@@ -0,0 +1,231 @@
+import datetime
+import glob
+import io
+import os
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from clock.config import connect, OUTFILE_PATH
+from clock import clock_models as cm
+from clock.b_import_clock_data import ImportFile
+from clock.c_transform_clock_data import Transform
+from clock.instrumentation import current_span, timed
+
+SAVE_OFFSET = """
+insert into follow_offsets (file_id, file_path, offset, updated_at)
+values (:file_id, :file_path, :offset, :updated_at)
+on conflict(file_id) do update
+    set file_path = excluded.file_path
+      , offset = excluded.offset
+      , updated_at = excluded.updated_at;
+"""
+
+
+class FollowFile(ImportFile):
+    """
+    A long-running version of ImportFile and Transform. Rather than reading the whole file and
+    rebuilding everything, it watches the swipe file (or a directory of rotated swipe files) and
+    every time something is appended it:
+
+    * reads only the bytes after the offset that it saved last time, up to the last complete line
+    * loads them into the staging table, the same as ImportFile
+    * adds them to the days that they belong to in clock_ins, which renumbers just those
+      employee/days and recomputes their daily reports, and the rollups that include them
+
+    The new offsets are committed in the same transaction as the clock_ins, so stopping it at any
+    point and starting it again neither skips nor repeats a swipe.
+    """
+
+    def __init__(self, engine, session, path=OUTFILE_PATH, pattern="*", poll_interval=1.0,
+                 max_batch_bytes=8 * 1024 * 1024, refresh_reports=True):
+        """
+        :param engine: A SQLAlchemy engine
+        :param session: A SQLAlchemy session object
+        :param path: The swipe file, or a directory of swipe files, to follow. The files in a
+            directory are read oldest first, so rotated files are finished before newer ones.
+        :param pattern: Which files in the directory to follow.
+        :param poll_interval: Seconds to wait before looking again when there is nothing new.
+        :param max_batch_bytes: The most that is read into one batch. Anything past it is picked
+            up by the next batch.
+        :param refresh_reports: Also update the report rollups after every batch. If not, the
+            dirty partitions are left for the next time that report_queries.sql runs.
+        """
+        super().__init__(engine, session)
+        self.path = path
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.max_batch_bytes = max_batch_bytes
+        self.refresh_reports = refresh_reports
+        self.transform = Transform(engine, session)
+        self.offsets = []
+        self.last_modified = None
+
+    def execute(self, max_batches=None, stop_when_idle=False):
+        """
+        Follow the file until stopped with Ctrl+C, or until one of the limits is reached.
+
+        :param max_batches: Stop after this many batches.
+        :param stop_when_idle: Stop as soon as there is nothing new to read, rather than waiting.
+        :return: None
+        """
+        print(f"Following {self.path}... {datetime.datetime.utcnow()}")
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                if self.follow_once():
+                    batches += 1
+                elif stop_when_idle:
+                    break
+                else:
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            print(f"...stopped following after {batches} batches. {datetime.datetime.utcnow()}")
+
+    @timed
+    def follow_once(self):
+        """
+        Read whatever has been appended since the last batch and bring the reports up to date
+        with it.
+
+        :return: The number of swipes in the batch.
+        :rtype: int
+        """
+        self.read_file()
+        if not self.row_count:
+            return 0
+
+        self.insert_to_staging_table()
+        self.check_row_counts()
+        self.transform.import_employees()
+        self.save_offsets()
+        self.transform.import_clock_times()
+        if self.refresh_reports:
+            self.transform.run_report_queries()
+
+        self.measure_latency()
+        current_span()["rows"] = self.row_count
+        return self.row_count
+
+    def read_file(self):
+        """
+        Read the bytes appended to each followed file since its saved offset into a dataframe.
+        Only whole lines are read; a line that is still being written is left for the next
+        batch. The offsets that the batch reads up to are kept in self.offsets until they are
+        saved by save_offsets.
+
+        :return: None
+        """
+        saved = dict(self.session.query(cm.FollowOffset.file_id, cm.FollowOffset.offset))
+        self.offsets = []
+        chunks = []
+        budget = self.max_batch_bytes
+        for file_path in self.files_to_follow():
+            stat = os.stat(file_path)
+            file_id = f"{stat.st_dev}:{stat.st_ino}"
+            offset = saved.get(file_id, 0)
+            if stat.st_size < offset:
+                # The file was truncated and written again, so start over from the beginning.
+                offset = 0
+            if stat.st_size == offset:
+                continue
+
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(min(stat.st_size - offset, budget))
+            end = data.rfind(b"\n") + 1
+            if not end:
+                if len(data) < budget:
+                    # The last line is still being written.
+                    continue
+                if budget == self.max_batch_bytes:
+                    raise ValueError(
+                        f"{file_path} has a line longer than max_batch_bytes at byte {offset}."
+                    )
+                # The files before this one used up most of the batch. Leave this one for the
+                # next batch, rather than reading the newer files before it.
+                break
+
+            chunks.append(data[:end])
+            self.offsets.append((file_id, file_path, offset + end))
+            self.last_modified = stat.st_mtime
+            budget -= end
+            if budget <= 0:
+                break
+
+        self.df = pd.read_csv(
+            io.BytesIO(b"".join(chunks)), header=None, names=["employee_id", "clock_time"]
+        ) if chunks else pd.DataFrame(columns=["employee_id", "clock_time"])
+        self.row_count, self.checksum = self.summarize_rows(self.df)
+        if self.row_count:
+            print(f"...read {self.row_count} new swipes from {len(chunks)} files. "
+                  f"{datetime.datetime.utcnow()}")
+
+    def files_to_follow(self):
+        """
+        :return: The followed file, or the files in the followed directory, oldest first.
+        :rtype: list
+        """
+        if not os.path.isdir(self.path):
+            return [self.path] if os.path.exists(self.path) else []
+        files = [
+            file_path for file_path in glob.glob(os.path.join(self.path, self.pattern))
+            if os.path.isfile(file_path)
+        ]
+        return sorted(files, key=lambda file_path: (os.path.getmtime(file_path), file_path))
+
+    def save_offsets(self):
+        """
+        Record how far the batch read into each file. This doesn't commit; the offsets are
+        committed along with the clock_ins by import_clock_times.
+
+        :return: None
+        """
+        updated_at = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        self.session.execute(
+            text(SAVE_OFFSET),
+            [
+                {"file_id": file_id, "file_path": file_path, "offset": offset,
+                 "updated_at": updated_at}
+                for file_id, file_path, offset in self.offsets
+            ],
+        )
+
+    def measure_latency(self):
+        """
+        Print (and add to the span) how long it took for the batch to reach the reports: from
+        when the file was last written to, and from the newest swipe in the batch. The second is
+        only meaningful when the swipes are happening live.
+
+        :return: None
+        """
+        write_latency = time.time() - self.last_modified
+        newest_swipe = pd.to_datetime(self.df["clock_time"]).max()
+        swipe_latency = (datetime.datetime.now() - newest_swipe).total_seconds()
+        current_span()["write_latency_seconds"] = write_latency
+        current_span()["swipe_latency_seconds"] = swipe_latency
+        print(f"...reported {self.row_count} swipes {write_latency:.2f}s after they were written "
+              f"({swipe_latency:.2f}s after the newest swipe). {datetime.datetime.utcnow()}")
+
+
+def main(path=OUTFILE_PATH, poll_interval=1.0, refresh_reports=True):
+    """
+    Follow a swipe file, or a directory of them, until stopped with Ctrl+C.
+
+    :param path: The file or directory to follow.
+    :param poll_interval: Seconds to wait before looking again when there is nothing new.
+    :param refresh_reports: Update the report rollups after every batch.
+    :return: None
+    """
+    print("Following Clock Data...")
+    engine, session = connect()
+    cm.create_models(engine=engine, session=session)
+
+    f = FollowFile(engine, session, path=path, poll_interval=poll_interval,
+                   refresh_reports=refresh_reports)
+    f.execute()
+
+
+if __name__ == '__main__':
+    main()
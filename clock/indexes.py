@@ -0,0 +1,80 @@
+"""
+The indexes that the transform and report SQL rely on, beyond the primary keys declared in
+clock_models. They are kept here, grouped by table, so that each one can be built at the right
+point in the load:
+
+* clock_staging is rebuilt on every import, so its indexes are created by the StagingLoader
+  after all of the data is in rather than maintained row by row during the load.
+* The destination and report tables are long-lived, so their indexes are created along with
+  the tables in clock_models.create_models.
+"""
+import datetime
+
+# A swipe is identified by its employee and time, so a swipe that is loaded twice is ignored
+# rather than stored twice; see insert_clock_times.sql.
+UNIQUE_INDEXES = {
+    "clock_ins": {
+        "ux_clock_ins_employee_id_clock_time": "(employee_id, clock_time)",
+    },
+}
+
+INDEXES = {
+    # insert_employees.sql takes the distinct employee_ids and insert_clock_times.sql groups
+    # and numbers the swipes by employee_id and clock_time.
+    "clock_staging": {
+        "ix_clock_staging_employee_id_clock_time": "(employee_id, clock_time)",
+    },
+    # Quarantined swipes are looked up by employee/day.
+    "clock_quarantine": {
+        "ix_clock_quarantine_employee_id_report_date": "(employee_id, report_date)",
+    },
+    # The date range reports in clock/reports.py read every employee's range of report_dates.
+    # The index includes total_floor_time_seconds so the table itself is never touched.
+    "employee_daily_report": {
+        "ix_employee_daily_report_report_date": "(report_date, total_floor_time_seconds)",
+    },
+    # When a change takes away a week's or a month's min or max floor time, it's looked up again
+    # with one seek on these.
+    "weekly_monthly_totals": {
+        "ix_weekly_monthly_totals_week_start": "(week_start, total_floor_time_seconds)",
+        "ix_weekly_monthly_totals_month_start": "(month_start, total_floor_time_seconds)",
+    },
+    # best_worst_25 ranks each year's totals, and clock/reports.py reads a range of years.
+    "total_annual_floor_time": {
+        "ix_total_annual_floor_time_report_year": "(report_year, yearly_floor_time)",
+    },
+    # The attendance of each changed year is ranked the same way.
+    "attendance": {
+        "ix_attendance_report_year": "(report_year, total_days)",
+    },
+}
+
+
+def create_indexes(cursor, table):
+    """
+    Create every index declared for a table, if it doesn't already exist.
+
+    :param cursor: A DB-API cursor or a SQLAlchemy session/connection.
+    :param table: The name of the table to index.
+    :return: None
+    """
+    for name, columns in UNIQUE_INDEXES.get(table, {}).items():
+        print(f"...creating unique index {name}. {datetime.datetime.utcnow()}")
+        cursor.execute(f"create unique index if not exists {name} on {table} {columns};")
+    for name, columns in INDEXES.get(table, {}).items():
+        print(f"...creating index {name}. {datetime.datetime.utcnow()}")
+        cursor.execute(f"create index if not exists {name} on {table} {columns};")
+
+
+def drop_indexes(cursor, table):
+    """
+    Drop every (non-unique) index declared for a table, such as before a very large backfill.
+    They can be put back afterwards with create_indexes. The unique indexes are left alone, as
+    the transform depends on them to skip swipes that are already loaded.
+
+    :param cursor: A DB-API cursor or a SQLAlchemy session/connection.
+    :param table: The name of the table.
+    :return: None
+    """
+    for name in INDEXES.get(table, {}):
+        cursor.execute(f"drop index if exists {name};")
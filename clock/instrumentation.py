@@ -0,0 +1,117 @@
+import contextlib
+import datetime
+import functools
+import json
+import os
+import time
+
+from clock.config import INSTRUMENTATION, METRICS_LOG_PATH, PROMETHEUS_PATH
+
+# Totals per (span name, labels) for the Prometheus textfile. These accumulate for the life of
+# the process, which for this pipeline is one run.
+_totals = {}
+_open_spans = []
+
+
+@contextlib.contextmanager
+def span(name, **labels):
+    """
+    Times a block of code. The span is a dict that the block can add to, most usefully "rows"
+    for the number of rows that it affected:
+
+        with span("insert_clock_times", file_name="insert_clock_times.sql") as s:
+            s["rows"] = result.rowcount
+
+    When INSTRUMENTATION is turned on, every span is written to METRICS_LOG_PATH as a line of
+    JSON and the running totals are written to PROMETHEUS_PATH for the node_exporter textfile
+    collector. When it is off, the span is still timed but nothing is written.
+
+    :param name: The name of the span, such as the method being timed.
+    :param labels: Anything else that identifies the span, such as the SQL file.
+    :return: The span, as a dict.
+    """
+    record = {
+        "span": name,
+        "labels": labels,
+        "parent": _open_spans[-1]["span"] if _open_spans else None,
+        "started_at": datetime.datetime.utcnow().isoformat(),
+        "rows": None,
+    }
+    _open_spans.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        _open_spans.pop()
+        if INSTRUMENTATION:
+            _record(record)
+
+
+def current_span():
+    """
+    The innermost span that is currently open, so that a method wrapped with timed can record
+    its rows. If there is no open span, a throwaway dict is returned.
+
+    :rtype: dict
+    """
+    return _open_spans[-1] if _open_spans else {}
+
+
+def timed(method):
+    """
+    Decorator that wraps a method in a span named after the method.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with span(method.__name__):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def _record(record):
+    with open(METRICS_LOG_PATH, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    key = (record["span"], tuple(sorted(record["labels"].items())))
+    totals = _totals.setdefault(key, {"count": 0, "seconds": 0.0, "rows": 0, "last": 0.0})
+    totals["count"] += 1
+    totals["seconds"] += record["seconds"]
+    totals["rows"] += record["rows"] or 0
+    totals["last"] = record["seconds"]
+    write_prometheus_textfile()
+
+
+def write_prometheus_textfile(path=PROMETHEUS_PATH):
+    """
+    Write the span totals in the Prometheus text exposition format. The file is written to a
+    temporary file and renamed so that a scrape never sees half of it.
+
+    :param path: Where to write the file.
+    :return: None
+    """
+    metrics = {
+        "clock_etl_span_seconds_total": ("counter", "Total time spent in the span.", "seconds"),
+        "clock_etl_span_count_total": ("counter", "Number of times the span ran.", "count"),
+        "clock_etl_span_rows_total": ("counter", "Rows affected within the span.", "rows"),
+        "clock_etl_span_last_seconds": ("gauge", "Duration of the latest run of the span.", "last"),
+    }
+
+    lines = []
+    for metric, (metric_type, description, field) in metrics.items():
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for (name, labels), totals in _totals.items():
+            label_text = ",".join(
+                f'{k}="{_escape(v)}"' for k, v in (("span", name),) + labels
+            )
+            lines.append(f"{metric}{{{label_text}}} {totals[field]}")
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temp_path, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
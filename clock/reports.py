@@ -0,0 +1,149 @@
+"""
+Date range reports over the rollups that report_queries.sql maintains. Every report takes the
+range it covers and only reads the rows in that range: the rollups are keyed by the date (or
+year) that each bucket starts on, so the range turns into an index range scan rather than a scan
+of the whole history. A monthly report for one month out of ten years of data reads one row of
+monthly_aggregate, and a daily report for that month reads one month of employee_daily_report.
+
+The tables store days as the number of days since 1970-01-01 and times as seconds since then
+(see clock_models). This is where they're turned back into dates: the dates passed in can be
+anything pandas can parse ("2019-03-01"), and the dates and times in the reports are datetimes.
+"""
+import pandas as pd
+
+from clock.clock_models import SECONDS_PER_DAY
+
+EPOCH = pd.Timestamp("1970-01-01")
+
+DAILY_REPORT = """
+select employee_id
+     , report_date
+     , start_time
+     , end_time
+     , total_floor_time_seconds
+from employee_daily_report
+where report_date between :start_day and :end_day
+order by report_date, employee_id;
+"""
+
+# Only the weeks that start and end within the range; a week that is cut off by the range
+# would otherwise look like an outlier next to the full weeks around it.
+WEEKLY_REPORT = """
+select week_start
+     , average_floor_time_seconds
+     , total_floor_time_seconds
+     , min_floor_time_seconds
+     , max_floor_time_seconds
+     , floor_time_days
+from weekly_aggregate
+where week_start between :start_day and :end_day - 6
+order by week_start;
+"""
+
+# Only the months that start and end within the range, for the same reason.
+MONTHLY_REPORT = """
+select month_start
+     , average_floor_time_seconds
+     , total_floor_time_seconds
+     , min_floor_time_seconds
+     , max_floor_time_seconds
+     , floor_time_days
+from monthly_aggregate
+where month_start >= :start_day
+  and month_start < :end_month
+order by month_start;
+"""
+
+ANNUAL_REPORT = """
+select t.report_year
+     , t.employee_id
+     , t.yearly_floor_time as yearly_floor_time_seconds
+     , t.yearly_floor_time / 60 / 60 as yearly_floor_time_hours
+     , a.total_days
+from total_annual_floor_time t
+left join attendance a on a.employee_id = t.employee_id
+                      and a.report_year = t.report_year
+where t.report_year between :start_year and :end_year
+order by t.report_year, t.employee_id;
+"""
+
+
+def daily_report(engine, start_date, end_date):
+    """
+    Every employee's daily report between two dates, inclusive.
+
+    :param engine: A SQLAlchemy engine
+    :param start_date: The first day of the report.
+    :param end_date: The last day of the report.
+    :return: One row per employee and day.
+    :rtype: pd.DataFrame
+    """
+    df = _read(engine, DAILY_REPORT, start_day=_day(start_date), end_day=_day(end_date))
+    df["report_date"] = _to_dates(df["report_date"])
+    df["start_time"] = pd.to_datetime(df["start_time"], unit="s")
+    df["end_time"] = pd.to_datetime(df["end_time"], unit="s")
+    return df
+
+
+def weekly_report(engine, start_date, end_date):
+    """
+    The floor time of every (Monday to Sunday) week that lies within two dates, inclusive.
+
+    :param engine: A SQLAlchemy engine
+    :param start_date: The first day of the report.
+    :param end_date: The last day of the report.
+    :return: One row per week, keyed by the Monday it starts on.
+    :rtype: pd.DataFrame
+    """
+    df = _read(engine, WEEKLY_REPORT, start_day=_day(start_date), end_day=_day(end_date))
+    df["week_start"] = _to_dates(df["week_start"])
+    return df
+
+
+def monthly_report(engine, start_date, end_date):
+    """
+    The floor time of every month that lies within two dates, inclusive.
+
+    :param engine: A SQLAlchemy engine
+    :param start_date: The first day of the report.
+    :param end_date: The last day of the report.
+    :return: One row per month, keyed by its first day.
+    :rtype: pd.DataFrame
+    """
+    # A month lies within the range if it starts before the month that the day after the range
+    # is in.
+    end_month = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).replace(day=1)
+    df = _read(engine, MONTHLY_REPORT, start_day=_day(start_date), end_month=_day(end_month))
+    df["month_start"] = _to_dates(df["month_start"])
+    return df
+
+
+def annual_report(engine, start_year, end_year=None):
+    """
+    Every employee's total floor time and days attended for a year, or a range of years.
+
+    :param engine: A SQLAlchemy engine
+    :param start_year: The first year of the report, such as 2019.
+    :param end_year: The last year of the report. Defaults to start_year.
+    :return: One row per employee and year.
+    :rtype: pd.DataFrame
+    """
+    end_year = start_year if end_year is None else end_year
+    return _read(engine, ANNUAL_REPORT, start_year=int(start_year), end_year=int(end_year))
+
+
+def _read(engine, sql, **params):
+    return pd.read_sql_query(sql, con=engine, params=params)
+
+
+def _day(date):
+    """
+    :param date: A date, or anything pandas can parse into one.
+    :return: The number of days from 1970-01-01 to the date.
+    :rtype: int
+    """
+    return (pd.Timestamp(date).normalize() - EPOCH).days
+
+
+def _to_dates(days):
+    return pd.to_datetime(days * SECONDS_PER_DAY, unit="s")
@@ -0,0 +1,215 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from clock.clock_models import SECONDS_PER_DAY
+
+# The swipes already stored for the employee/days in the staging table, found the same way as in
+# insert_clock_times.sql: one primary key search of clock_ins per staged employee/day.
+STORED_CLOCK_INS = """
+select c.employee_id
+     , c.report_date as day
+     , c.clock_time as epoch
+from (
+    select distinct employee_id
+         , cast(strftime('%s', clock_time) as integer) / 86400 as report_date
+    from clock_staging
+) d
+cross join clock_ins c on c.employee_id = d.employee_id
+                      and c.report_date = d.report_date;
+"""
+
+INSERT_CLOCK_INS = """
+insert or ignore into clock_ins (employee_id, report_date, clock_in_number, clock_time)
+values (?, ?, ?, ?);
+"""
+
+INSERT_DIRTY_PARTITION = """
+insert or ignore into dirty_partitions (employee_id, report_date) values (?, ?);
+"""
+
+UPSERT_DAILY_REPORT = """
+insert into employee_daily_report
+    (employee_id, report_date, start_time, end_time, total_floor_time_seconds)
+values (?, ?, ?, ?, ?)
+on conflict(employee_id, report_date) do update
+    set start_time = excluded.start_time
+      , end_time = excluded.end_time
+      , total_floor_time_seconds = excluded.total_floor_time_seconds;
+"""
+
+
+class Sessionize:
+    """
+    An in-memory alternative to insert_clock_times.sql. It produces the same clock_ins and
+    employee_daily_report rows, but rather than building a series of temp tables and
+    self-joins in SQLite it reads the staged swipes once, sorts them once by employee and
+    clock time, and does the rest with array operations:
+
+    * the clock_in_number is the position of a swipe within its employee/day
+    * odd numbered swipes are clock-ins and the next swipe in the same employee/day is the
+      matching clock-out, so pairing is just comparing the array with itself shifted by one
+    * floor time, start time, and end time are reduced per employee/day group
+
+    Unlike the SQL, this assumes that the staging table holds whole days of swipes: it numbers
+    the staged swipes on their own, so it can't add to a day that is already stored. Staging the
+    same days again is fine, but a staged day with different swipes than the stored one is
+    refused before anything is written (see check_whole_days). A swipe that is staged twice is
+    only counted once, the same as the SQL. This is only worthwhile while the staging table fits
+    into memory; beyond that, use the SQL.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.df = None
+        self.group_starts = None
+        self.daily_report = None
+
+    def execute(self):
+        self.read_staging_table()
+        self.drop_duplicate_swipes()
+        self.check_whole_days()
+        self.number_clock_ins()
+        self.build_daily_report()
+        self.write_results()
+
+    def read_staging_table(self):
+        """
+        Pull the staged swipes into a dataframe sorted by employee and clock time, and convert
+        the clock times to seconds since the epoch along with a day number for grouping.
+
+        :return: None
+        """
+        print(f"...reading clock_staging into dataframe. {datetime.datetime.utcnow()}")
+        df = pd.read_sql_query(
+            "select employee_id, clock_time from clock_staging;", con=self.engine
+        )
+        clock_time = pd.to_datetime(df["clock_time"], format="%Y-%m-%d %H:%M:%S")
+        df["epoch"] = clock_time.values.astype("datetime64[s]").astype(np.int64)
+        df["day"] = df["epoch"] // SECONDS_PER_DAY
+
+        self.df = df.sort_values(["employee_id", "epoch"], kind="mergesort", ignore_index=True)
+
+    def drop_duplicate_swipes(self):
+        """
+        Keep only one of a swipe that is staged more than once. This is a separate step so that
+        ValidateStaging, which reads the swipes the same way, still sees the duplicates.
+
+        :return: None
+        """
+        self.df = self.df.drop_duplicates(["employee_id", "epoch"], ignore_index=True)
+
+    def check_whole_days(self):
+        """
+        Make sure that every staged employee/day that is already in clock_ins has exactly the
+        swipes that are stored for it, such as when a file is loaded again. A day that only has
+        some of its swipes stored (part of the day was loaded before) or that has swipes that
+        aren't staged can't be numbered from the staging table alone; the SQL handles those.
+
+        :return: None
+        """
+        stored = pd.read_sql_query(STORED_CLOCK_INS, con=self.engine)
+        if stored.empty:
+            return
+
+        keys = ["employee_id", "day"]
+        staged = self.df[keys + ["epoch"]].merge(stored[keys].drop_duplicates(), on=keys)
+        swipes = staged.merge(stored, on=keys + ["epoch"], how="outer", indicator=True)
+        partial_days = swipes.loc[swipes["_merge"] != "both", keys].drop_duplicates()
+        if partial_days.empty:
+            return
+
+        employee_id, day = partial_days.iloc[0]
+        first_date = datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))
+        raise ValueError(
+            f"{len(partial_days)} employee/days in clock_staging don't match the swipes already "
+            f"stored for them (such as employee {employee_id} on {first_date}). The pandas "
+            f"method needs whole days in the staging table; use the sql method to add to a day."
+        )
+
+    def number_clock_ins(self):
+        """
+        Equivalent of the row_number() window in the SQL. A new group starts wherever the
+        employee or the day changes; a swipe's number is its distance from the start of its
+        group.
+
+        :return: None
+        """
+        employee_id = self.df["employee_id"].values
+        day = self.df["day"].values
+
+        new_group = np.ones(len(self.df), dtype=bool)
+        new_group[1:] = (employee_id[1:] != employee_id[:-1]) | (day[1:] != day[:-1])
+        self.group_starts = np.flatnonzero(new_group)
+
+        group = np.cumsum(new_group) - 1
+        self.df["group"] = group
+        self.df["clock_in_number"] = np.arange(len(self.df)) - self.group_starts[group] + 1
+
+    def build_daily_report(self):
+        """
+        Pair each odd numbered swipe with the swipe immediately after it in the same group and
+        sum the differences per group. A day with no complete pair gets a NULL floor time, which
+        matches the left join in the SQL. Start and end times are simply the first and last
+        swipes of each group, because the data is already sorted.
+
+        :return: None
+        """
+        group = self.df["group"].values
+        epoch = self.df["epoch"].values
+        clock_in_number = self.df["clock_in_number"].values
+        group_count = len(self.group_starts)
+
+        clock_ins = np.flatnonzero(clock_in_number[:-1] % 2 == 1)
+        clock_ins = clock_ins[group[clock_ins] == group[clock_ins + 1]]
+        floor_time = epoch[clock_ins + 1] - epoch[clock_ins]
+
+        total_floor_time = np.zeros(group_count, dtype=np.int64)
+        np.add.at(total_floor_time, group[clock_ins], floor_time)
+        pairs = np.bincount(group[clock_ins], minlength=group_count)
+
+        group_ends = np.append(self.group_starts[1:], len(self.df)) - 1
+        self.daily_report = pd.DataFrame(
+            {
+                "employee_id": self.df["employee_id"].values[self.group_starts],
+                "report_date": self.df["day"].values[self.group_starts],
+                "start_time": epoch[self.group_starts],
+                "end_time": epoch[group_ends],
+                "total_floor_time_seconds": pd.array(total_floor_time, dtype="Int64"),
+            }
+        )
+        self.daily_report.loc[pairs == 0, "total_floor_time_seconds"] = pd.NA
+
+    def write_results(self):
+        """
+        Insert the numbered swipes into clock_ins (ignoring any that are already there, the same
+        as the SQL) and upsert the daily report, in a single transaction. The employee/days are
+        also marked dirty so that report_queries.sql updates their rollups. The days and epochs
+        are stored as they are, the same as the SQL stores them.
+
+        :return: None
+        """
+        print(f"...writing clock_ins and employee_daily_report. {datetime.datetime.utcnow()}")
+        clock_ins = self.df[["employee_id", "day", "clock_in_number", "epoch"]]
+        daily_report = self.daily_report.astype(object).where(self.daily_report.notna(), None)
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN")
+            cursor.executemany(INSERT_CLOCK_INS, clock_ins.itertuples(index=False, name=None))
+            cursor.executemany(
+                UPSERT_DAILY_REPORT, daily_report.itertuples(index=False, name=None)
+            )
+            cursor.executemany(
+                INSERT_DIRTY_PARTITION,
+                daily_report[["employee_id", "report_date"]].itertuples(index=False, name=None),
+            )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        print(f"...done! {datetime.datetime.utcnow()}")
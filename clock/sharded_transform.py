@@ -0,0 +1,153 @@
+import datetime
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from clock.clock_models import execute_sql_file, read_sql_file
+from clock.instrumentation import current_span, timed
+
+# The tables that insert_clock_times.sql reads and writes. Each shard database gets an empty
+# copy of each of them, and of their unique indexes, created from the main database's own schema.
+SHARD_TABLES = ("clock_staging", "clock_ins", "dirty_partitions", "employee_daily_report")
+
+# A shard database is scratch space that is thrown away after the merge, so there is no point
+# in journaling or syncing it.
+SHARD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+}
+
+
+class ShardedTransform:
+    """
+    A parallel alternative to running insert_clock_times.sql on the main database. Everything
+    the transform computes (the numbering of the swipes, the pairing of clock-ins and
+    clock-outs, the daily report) is independent per employee, so the employees are split into
+    shards by employee_id % workers and each shard is transformed in its own process:
+
+    * each worker creates its own shard database, attaches the main database, and copies in its
+      employees' staged swipes, dirty partitions, and the clock_ins already stored for those
+      days (prepare_shard.sql)
+    * it then runs insert_clock_times.sql, unchanged, against the shard
+    * once every shard is done, they are merged back into the main database one at a time
+      (merge_shard.sql)
+
+    SQLite only allows one writer, so the merge is serial, but it only writes finished rows;
+    the work of the transform happens in the workers. The rows that end up in clock_ins and
+    employee_daily_report are the same as those from the serial transform.
+    """
+
+    def __init__(self, engine, session, workers=None):
+        """
+        :param engine: A SQLAlchemy engine
+        :param session: A SQLAlchemy session object
+        :param workers: The number of shards, and processes. Defaults to the number of CPUs.
+        """
+        self.engine = engine
+        self.session = session
+        self.workers = workers or os.cpu_count()
+        self.db_path = os.path.abspath(engine.url.database)
+        self.shard_paths = [f"{self.db_path}.shard_{i:03d}" for i in range(self.workers)]
+
+    def execute(self):
+        try:
+            self.transform_shards()
+            self.merge_shards()
+        finally:
+            self.clean_up()
+
+    @timed
+    def transform_shards(self):
+        """
+        Transform every shard in its own process.
+
+        :return: None
+        """
+        print(f"...transforming {self.workers} shards. {datetime.datetime.utcnow()}")
+        prepare_sql = read_sql_file('prepare_shard.sql')
+        transform_sql = read_sql_file('insert_clock_times.sql')
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(
+                    _transform_shard,
+                    self.db_path,
+                    shard_path,
+                    shard,
+                    self.workers,
+                    prepare_sql,
+                    transform_sql,
+                )
+                for shard, shard_path in enumerate(self.shard_paths)
+            ]
+            rows = sum(future.result() for future in futures)
+        current_span()["rows"] = rows
+        print(f"...built {rows} daily reports. {datetime.datetime.utcnow()}")
+
+    @timed
+    def merge_shards(self):
+        """
+        Merge each shard into the main database. A database can't be detached in the middle of a
+        transaction, so each shard is merged in a transaction of its own. If this fails part way
+        through, running the transform again is safe: the staging table is still there, and the
+        merge only adds the swipes that aren't stored yet, rewrites the days that the shard
+        renumbered, and replaces the daily reports of the days it touches.
+
+        :return: None
+        """
+        for shard_path in self.shard_paths:
+            print(f"...merging {os.path.basename(shard_path)}. {datetime.datetime.utcnow()}")
+            connection = self.session.connection().connection
+            connection.execute("attach database ? as shard;", (shard_path,))
+            try:
+                execute_sql_file('merge_shard.sql', self.session, commit=False)
+                connection.commit()
+            finally:
+                connection.execute("detach database shard;")
+                self.session.commit()
+
+    def clean_up(self):
+        for shard_path in self.shard_paths:
+            if os.path.exists(shard_path):
+                os.unlink(shard_path)
+
+
+def _transform_shard(db_path, shard_path, shard, shards, prepare_sql, transform_sql):
+    """
+    Worker for ShardedTransform.transform_shards. This has to live at the module level so that it
+    can be pickled and sent to the process pool. It talks to SQLite directly rather than through
+    the SQLAlchemy engine, which belongs to the parent process.
+
+    :return: The number of daily reports in the shard.
+    :rtype: int
+    """
+    if os.path.exists(shard_path):
+        os.unlink(shard_path)
+
+    connection = sqlite3.connect(shard_path, isolation_level=None)
+    try:
+        cursor = connection.cursor()
+        for name, value in SHARD_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value};")
+        cursor.execute("attach database ? as source;", (db_path,))
+
+        cursor.execute("BEGIN")
+        table_names = ", ".join(f"'{table}'" for table in SHARD_TABLES)
+        schema = cursor.execute(
+            f"select sql from source.sqlite_master "
+            f"where tbl_name in ({table_names}) "
+            f"and (type = 'table' or sql like 'CREATE UNIQUE INDEX%') "
+            f"order by type = 'index';"
+        ).fetchall()
+        for (sql,) in schema:
+            cursor.execute(sql)
+        for sql in prepare_sql:
+            cursor.execute(sql, {"shard": shard, "shards": shards})
+        for sql in transform_sql:
+            cursor.execute(sql)
+        cursor.execute("COMMIT")
+
+        return cursor.execute("select count(*) from employee_daily_report;").fetchone()[0]
+    finally:
+        connection.close()
@@ -0,0 +1,59 @@
+--Run once, before the unique index on clock_ins (employee_id, clock_time) is built. Earlier
+-- versions numbered every staged swipe, so the same swipe in the file twice was stored twice.
+-- The first of each is kept and the rest are deleted, and the days they were on are numbered
+-- again so that clock ins are still odd and clock outs even. The days are also marked dirty, so
+-- that the next transform recomputes their reports.
+drop table if exists duplicate_clock_ins;
+create temp table duplicate_clock_ins as
+select employee_id
+     , report_date
+     , clock_time
+     , min(clock_in_number) as first_clock_in_number
+from clock_ins
+group by employee_id, report_date, clock_time
+having count(*) > 1;
+
+INSERT OR IGNORE INTO dirty_partitions(employee_id, report_date)
+select distinct employee_id
+     , report_date
+from duplicate_clock_ins;
+
+delete from clock_ins
+where rowid in (
+    select c.rowid
+    from duplicate_clock_ins d
+    cross join clock_ins c on c.employee_id = d.employee_id
+                          and c.report_date = d.report_date
+                          and c.clock_time = d.clock_time
+                          and c.clock_in_number > d.first_clock_in_number
+);
+
+drop table if exists renumbered_clock_ins;
+create temp table renumbered_clock_ins as
+select c.employee_id
+     , c.report_date
+     , row_number() over (partition by c.employee_id, c.report_date
+                          order by c.clock_time) as clock_in_number
+     , c.clock_time
+from (select distinct employee_id, report_date from duplicate_clock_ins) d
+cross join clock_ins c on c.employee_id = d.employee_id
+                      and c.report_date = d.report_date;
+
+delete from clock_ins
+where rowid in (
+    select c.rowid
+    from (select distinct employee_id, report_date from duplicate_clock_ins) d
+    cross join clock_ins c on c.employee_id = d.employee_id
+                          and c.report_date = d.report_date
+);
+
+INSERT INTO clock_ins(employee_id, report_date, clock_in_number, clock_time)
+select employee_id
+     , report_date
+     , clock_in_number
+     , clock_time
+from renumbered_clock_ins;
+
+--Clean up:
+drop table if exists duplicate_clock_ins;
+drop table if exists renumbered_clock_ins;
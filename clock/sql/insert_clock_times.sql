@@ -1,144 +1,160 @@
---First, we'll add just the clock_date to the table. This lets us add a row number and partition
--- by the date of the clock in.
-drop table if exists add_clock_date;
-create temp table add_clock_date as
+--A swipe is identified by what it is, the employee and the time, rather than by where it falls in
+-- its day. clock_ins has a unique index on (employee_id, clock_time), so finding the staged
+-- swipes that aren't stored yet is one index lookup per swipe, no matter how large clock_ins has
+-- grown. A swipe that is already there, such as from a file that overlaps one that was loaded
+-- before, is skipped, and one that is in the staging table twice is only kept once.
+--
+--This is also where the text in the file becomes integers: clock_time is parsed into seconds
+-- since 1970 once per swipe, here, and its report_date (the number of days since 1970) is just
+-- that divided by the seconds in a day. Nothing after this parses a date. The "materialized"
+-- keeps SQLite from copying the strftime() into every place clock_time is used below.
+drop table if exists new_clock_ins;
+create temp table new_clock_ins as
+with staged_clock_ins as materialized (
     select employee_id
-         , date(clock_time) as clock_date
-         , clock_time
-    from clock_staging;
+         , cast(strftime('%s', clock_time) as integer) as clock_time
+    from clock_staging
+)
+select distinct s.employee_id
+     , s.clock_time / 86400 as report_date
+     , s.clock_time
+from staged_clock_ins s
+where not exists (
+    select 1
+    from clock_ins c
+    where c.employee_id = s.employee_id
+      and c.clock_time = s.clock_time
+);
+
+--For each employee/day that has a new swipe, how many swipes are already stored and the time of
+-- the last one. It has to be a left join so that a day with nothing stored yet still gets a row,
+-- with stored_clock_ins = 0. SQLite can't reorder a left join, so the small derived table of new
+-- days stays the outer loop and clock_ins is searched by its primary key for just those days,
+-- rather than scanned in key order, which is the whole history.
+drop table if exists new_clock_in_days;
+create temp table new_clock_in_days as
+select d.employee_id
+     , d.report_date
+     , d.first_new_clock_time
+     , coalesce(max(c.clock_in_number), 0) as stored_clock_ins
+     , max(c.clock_time) as last_stored_clock_time
+from (
+    select employee_id, report_date, min(clock_time) as first_new_clock_time
+    from new_clock_ins
+    group by employee_id, report_date
+) d
+left join clock_ins c on c.employee_id = d.employee_id
+                     and c.report_date = d.report_date
+group by d.employee_id, d.report_date;
 
---Next, we'll add a row number that is partitioned by the employee_id and the clock_date.  In
--- this case, if there are 6 clocks ins for employee_id 0 on 2019-01-01, then there will be 6
--- rows, ordered sequentially.
-drop table if exists add_clock_date_row_number;
-create temp  table add_clock_date_row_number as
+--These are the "dirty" partitions. Everything after this only looks at these, so a run over a
+-- day's worth of swipes only does a day's worth of work no matter how much history there is,
+-- and a run over swipes that were all loaded before does next to nothing. If the partitions are
+-- already marked (for example, by a full refresh) they're left alone.
+INSERT OR IGNORE INTO dirty_partitions(employee_id, report_date)
 select employee_id
-     , clock_date
-     , clock_time
-     , row_number() over (partition by employee_id, clock_date order by employee_id, clock_time)
-      as employee_clock_date_order
-from add_clock_date
-order by employee_id, clock_date, clock_time;
+     , report_date
+from new_clock_in_days;
 
---SQLite doesn't allow us to alter a table to add a primary key, so we just create one that has
--- the primary key enforcement on it.  This way, we verify that no employee_id is inserted that
--- doesn't exist in the employee table. Additionally, we make sure we eliminate any duplicates
--- etc. by primary key enforcement.
-INSERT INTO clock_ins(employee_id, report_date, clock_in_number, clock_time)
-SELECT t1.employee_id
-     , t1.clock_date as report_date
-     , t1.employee_clock_date_order as clock_in_number
-     , t1.clock_time
-from add_clock_date_row_number t1
-left join clock_ins t2 on t1.employee_id = t2.employee_id
-                      and t1.clock_date = t2.report_date
-                      and t1.employee_clock_date_order = t2.clock_in_number
-where t2.employee_id is null
-  and t2.report_date is null
-  and t2.clock_in_number is null;
+--Usually the new swipes of a day all come after the ones that are stored (it's a new day, or the
+-- rest of a day that's still going), and they're simply numbered on from the last one. If one
+-- arrives out of order, the stored swipes of that day are taken out and numbered again along
+-- with the new ones.
+INSERT INTO new_clock_ins(employee_id, report_date, clock_time)
+select c.employee_id
+     , c.report_date
+     , c.clock_time
+from new_clock_in_days d
+cross join clock_ins c on c.employee_id = d.employee_id
+                      and c.report_date = d.report_date
+where d.first_new_clock_time < d.last_stored_clock_time;
 
+delete from clock_ins
+where rowid in (
+    select c.rowid
+    from new_clock_in_days d
+    cross join clock_ins c on c.employee_id = d.employee_id
+                          and c.report_date = d.report_date
+    where d.first_new_clock_time < d.last_stored_clock_time
+);
 
---Clock ins must be odd, clock_outs must be even.  In this smal lsample set, the maximum we have
--- are 6 total clock events in a day so I just hard coded this.
-drop table if exists join_ins_to_outs;
-create temp table join_ins_to_outs as
-with ins as (
-    select employee_id, report_date, clock_in_number, clock_time
-    from clock_ins
-    where clock_in_number in (1, 3, 5)
-), outs as (
-    select employee_id, report_date, clock_in_number, clock_time
-    from clock_ins
-    where clock_in_number in (2,4,6)
-)
-select i.employee_id,
-       i.report_date,
-       i.clock_in_number,
-       o.clock_in_number as clock_out_number,
-       i.clock_time as clock_in_time,
-       o.clock_time as clock_out_time,
-       strftime('%s', i.clock_time) clock_in_epoch,
-       strftime('%s', o.clock_time) clock_out_epoch
-from ins i
---Joins ins to the outs, which are by definition the next sequential event:
-inner join outs o on i.employee_id = o.employee_id
-                 and i.report_date = o.report_date
-                 and i.clock_in_number + 1= o.clock_in_number;
+update new_clock_in_days
+set stored_clock_ins = 0
+where first_new_clock_time < last_stored_clock_time;
 
---Next, we'll calculate the difference, in seconds, of the in vs the out:
-drop table if exists add_floor_time_seconds;
-create temp table add_floor_time_seconds as
-select employee_id
-     , report_date
-     , clock_in_number
-     , clock_out_number
-     , clock_in_time
-     , clock_out_time
-     , clock_in_epoch
-     , clock_out_epoch
-     , clock_out_epoch - clock_in_epoch as floor_time_seconds
-from join_ins_to_outs;
+--Finally, the swipes are numbered in clock_time order within their employee/day. If there are 6
+-- clock ins for employee_id 0 on 2019-01-01, then they are numbered 1 to 6, whether they arrived
+-- in one file or several. The "or ignore" means the unique index has the final say on whether a
+-- swipe is already stored.
+INSERT OR IGNORE INTO clock_ins(employee_id, report_date, clock_in_number, clock_time)
+select n.employee_id
+     , n.report_date
+     , d.stored_clock_ins
+       + row_number() over (partition by n.employee_id, n.report_date order by n.clock_time)
+      as clock_in_number
+     , n.clock_time
+from new_clock_ins n
+join new_clock_in_days d on d.employee_id = n.employee_id
+                        and d.report_date = n.report_date
+order by n.employee_id, n.report_date, n.clock_time;
 
---Finally for this step, we'll aggregate the total floor time:
-drop table if exists aggregate_floor_time;
-create temp table aggregate_floor_time as
-    select employee_id
-         , report_date
-         , sum(floor_time_seconds) as total_floor_time
-    from add_floor_time_seconds
-group by employee_id, report_date;
 
---To get the start/end time of an employee, we can do a simple aggregation:
-drop table if exists start_end_times;
-create temp table start_end_times as
+--Clock ins must be odd, clock_outs must be even. Rather than joining the ins to the outs, we
+-- walk each employee/day in clock_in_number order once and use lead() to look at the next
+-- swipe. Every odd numbered swipe is a clock in and the next swipe is, by definition, its clock
+-- out, so there is no limit on the number of swipes in a day. The times are already seconds, so
+-- its floor time is a subtraction. An odd swipe without a next swipe has a NULL difference,
+-- which sum() ignores.
+--
+--The same pass gives us the start/end time, which is just the min/max clock_time of the day.
+-- Only the dirty partitions are read, and the day only exists here if it has clock_ins. The
+-- cross join is there for the same reason as above.
+drop table if exists daily_floor_time;
+create temp table daily_floor_time as
+with ordered_clock_ins as (
+    select c.employee_id
+         , c.report_date
+         , c.clock_in_number
+         , c.clock_time
+         , lead(c.clock_time) over (partition by c.employee_id, c.report_date
+                                    order by c.clock_in_number) as next_clock_time
+    from dirty_partitions d
+    cross join clock_ins c on c.employee_id = d.employee_id
+                          and c.report_date = d.report_date
+)
 select employee_id
      , report_date
      , min(clock_time) as start_time
      , max(clock_time) as end_time
-from clock_ins
-group by employee_id, report_date
-order by employee_id, report_date;
-
---Now, we'll just get the employee/days and join them to the two reports from above. Note that
--- left joins were chosen over inner joins. Technically, they should produce identical output.
--- If I were doing this in a more robust fashion, I would include some error handling here to
--- make sure that the left joins didn't produce any NULL values, because if we do, there woudl
--- be a problem.
-drop table if exists join_all;
-create temp table join_all as
-with distinct_days as (
-    select distinct employee_id, report_date
-    from clock_ins
-)
-select t1.employee_id
-     , t1.report_date
-     , start_time
-     , end_time
-     , total_floor_time
-from distinct_days t1
-left join aggregate_floor_time t2 on t1.employee_id = t2.employee_id
-                                   and t1.report_date = t2.report_date
-left join start_end_times t3 on t3.employee_id = t1.employee_id
-                            and t3.report_date = t1.report_date;
+     , sum(case when clock_in_number % 2 = 1
+                then next_clock_time - clock_time
+           end) as total_floor_time
+from ordered_clock_ins
+group by employee_id, report_date;
 
+--Unlike the clock_ins, a day's report can change as new clock data for that day arrives, so
+-- this is an upsert. Only the dirty partitions are in daily_floor_time, so nothing else is
+-- touched. The "where true" is required by SQLite to tell the upsert apart from a join
+-- constraint.
 INSERT INTO employee_daily_report(employee_id, report_date, start_time, end_time, total_floor_time_seconds)
 SELECT t1.employee_id
      , t1.report_date
      , t1.start_time
      , t1.end_time
      , total_floor_time
-from join_all t1
-left join employee_daily_report t2 on t1.employee_id = t2.employee_id
-                                  and t1.report_date = t2.report_date
-where t2.employee_id is null
-  and t2.report_date is null;
+from daily_floor_time t1
+where true
+on conflict(employee_id, report_date) do update
+    set start_time = excluded.start_time
+      , end_time = excluded.end_time
+      , total_floor_time_seconds = excluded.total_floor_time_seconds;
+
+--The dirty partitions are left in place for report_queries.sql, which updates the rollups of
+-- the changed employees, weeks, and months and then clears them.
 
 
 
 --Clean up:
-drop table if exists add_clock_date;
-drop table if exists add_clock_date_row_number;
-drop table if exists join_ins_to_outs;
-drop table if exists add_floor_time_seconds;
-drop table if exists aggregate_floor_time;
-drop table if exists start_end_times;
\ No newline at end of file
+drop table if exists new_clock_ins;
+drop table if exists new_clock_in_days;
+drop table if exists daily_floor_time;
\ No newline at end of file
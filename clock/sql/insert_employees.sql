@@ -28,7 +28,7 @@ from t1;
 -- IDs... bigints have billions of rows of availability and UUIDs can substitute in cases where
 -- this is a possibility.
 INSERT INTO employee(employee_id)
-select e.employee_id
+select de.employee_id
 from distinct_employees de
 left join employee e on de.employee_id = e.employee_id
 where e.employee_id is null;
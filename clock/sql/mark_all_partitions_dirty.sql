@@ -0,0 +1,11 @@
+--Marks every employee/day that we have clock data for as dirty, so that the next run of
+-- insert_clock_times.sql recomputes the whole employee_daily_report rather than just the
+-- partitions in the staging table. This is only needed if the logic in that file changes.
+INSERT INTO dirty_partitions(employee_id, report_date)
+select distinct c.employee_id
+     , c.report_date
+from clock_ins c
+left join dirty_partitions d on c.employee_id = d.employee_id
+                            and c.report_date = d.report_date
+where d.employee_id is null
+  and d.report_date is null;
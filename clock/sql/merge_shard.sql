@@ -0,0 +1,71 @@
+--Run against the main database with a transformed shard attached as "shard". The shard only
+-- holds its own employees, so this can't overwrite another shard's rows, and the result is the
+-- same as if insert_clock_times.sql had been run on the main database.
+
+--The partitions the shard recomputed, for report_queries.sql:
+INSERT OR IGNORE INTO dirty_partitions(employee_id, report_date)
+select employee_id
+     , report_date
+from shard.dirty_partitions;
+
+--The days the shard renumbered: the ones where a new swipe came in before the last one that is
+-- stored here, the same test as in insert_clock_times.sql. A swipe is new if it isn't stored here
+-- yet, which is one lookup on the unique index per swipe in the shard.
+drop table if exists renumbered_days;
+create temp table renumbered_days as
+select n.employee_id
+     , n.report_date
+from (
+    select s.employee_id, s.report_date, min(s.clock_time) as first_new_clock_time
+    from shard.clock_ins s
+    where not exists (
+        select 1
+        from clock_ins c
+        where c.employee_id = s.employee_id
+          and c.clock_time = s.clock_time
+    )
+    group by s.employee_id, s.report_date
+) n
+where n.first_new_clock_time < (
+    select max(c.clock_time)
+    from clock_ins c
+    where c.employee_id = n.employee_id
+      and c.report_date = n.report_date
+);
+
+--Only the swipes of those days are taken out here, to be replaced by the shard's numbering.
+delete from clock_ins
+where rowid in (
+    select c.rowid
+    from renumbered_days d
+    cross join clock_ins c on c.employee_id = d.employee_id
+                          and c.report_date = d.report_date
+);
+
+--The shard only holds the clock_ins of the days it touched. On every other day, the new swipes
+-- were numbered on from the ones stored here, which the shard has with the same numbers, so the
+-- unique index on (employee_id, clock_time) skips them and only the new swipes are written. A
+-- day that was renumbered is written whole.
+INSERT OR IGNORE INTO clock_ins(employee_id, report_date, clock_in_number, clock_time)
+select employee_id
+     , report_date
+     , clock_in_number
+     , clock_time
+from shard.clock_ins;
+
+--The shard only has reports for its dirty partitions, which replace what is here:
+INSERT INTO employee_daily_report(employee_id, report_date, start_time, end_time, total_floor_time_seconds)
+select s.employee_id
+     , s.report_date
+     , s.start_time
+     , s.end_time
+     , s.total_floor_time_seconds
+from shard.employee_daily_report s
+where true
+on conflict(employee_id, report_date) do update
+    set start_time = excluded.start_time
+      , end_time = excluded.end_time
+      , total_floor_time_seconds = excluded.total_floor_time_seconds;
+
+--Clean up:
+drop table if exists renumbered_days;
@@ -0,0 +1,37 @@
+--Run by each worker of the sharded transform against its own, empty shard database, with the
+-- main database attached as "source". A shard holds only its own employees
+-- (employee_id % :shards = :shard), which is all that insert_clock_times.sql needs, because
+-- everything it computes is per employee/day.
+
+--The new swipes, and any partitions that were already marked dirty (for example, by a full
+-- refresh):
+INSERT INTO main.clock_staging(employee_id, clock_time)
+select employee_id
+     , clock_time
+from source.clock_staging
+where employee_id % :shards = :shard;
+
+INSERT INTO main.dirty_partitions(employee_id, report_date)
+select employee_id
+     , report_date
+from source.dirty_partitions
+where employee_id % :shards = :shard;
+
+--The clock_ins that are already stored for those days. insert_clock_times.sql skips the swipes
+-- that are already there and renumbers each changed day with all of its swipes, so the shard
+-- needs them to do the same as the serial transform. Every other day is left in the main
+-- database.
+INSERT INTO main.clock_ins(employee_id, report_date, clock_in_number, clock_time)
+select c.employee_id
+     , c.report_date
+     , c.clock_in_number
+     , c.clock_time
+from (
+    select employee_id, report_date
+    from main.dirty_partitions
+    union
+    select employee_id, cast(strftime('%s', clock_time) as integer) / 86400 as report_date
+    from main.clock_staging
+) d
+cross join source.clock_ins c on c.employee_id = d.employee_id
+                             and c.report_date = d.report_date;
@@ -1,29 +1,115 @@
---1. Aggregate the total, annual floor time.
--- This simply sums the number of seconds per person for the whole year.  Year is implied
--- because the data only exists for a year. If we had additional yearly data, we'd have to group
--- by the year too.
-drop table if exists total_annual_floor_time;
-create table total_annual_floor_time as
-select employee_id, sum(total_floor_time_seconds) as yearly_floor_time
-    from employee_daily_report
-    group by employee_id;
-
---2. Retrieve the employees that had the most and least amount of time for the year.
-drop table if exists best_worst_25;
-create table best_worst_25 as
-with t1 as (
-    select employee_id, yearly_floor_time
-    from total_annual_floor_time
-    group by employee_id
-), ranked as (
+--These reports are maintained rollups of employee_daily_report. Rather than rebuilding them from
+-- the whole history on every run, each dirty partition (an employee/day whose daily report was
+-- just recomputed) is turned into a change: its old value, as of the last time the reports were
+-- updated, and its new one. The sums and counts of the employees, weeks, and months that the
+-- changes fall into have the difference added to them, and their mins and maxes are combined
+-- with the new values, so the cost of a refresh follows the number of changed days rather than
+-- the size of the history. The averages are the stored sum over the stored count, so they stay
+-- exact.
+--
+-- Every bucket includes its year. A week is keyed by the Monday it starts on and a month by its
+-- first day, rather than strftime('%W') or strftime('%m'), which would add the same week of
+-- every year together and split the week that spans new year's in two.
+--
+-- Days are stored as the number of days since 1970-01-01, which was a Thursday, so the Monday
+-- on or before a day is (day + 3) % 7 days earlier; no date has to be parsed. Months and years
+-- don't have a fixed length, so those go through SQLite's calendar, but only once per changed
+-- day. Everything after that compares the stored integers.
+
+--1. The change to every dirty partition. weekly_monthly_totals holds a copy of each daily report
+-- as the reports last saw it, so it has the old value and employee_daily_report has the new one.
+-- This holds no matter how many times the transform ran in between. A day that the reports
+-- haven't seen yet has no old value, and the "is not null" columns are 1 or 0 for whether there
+-- is a day, and a floor time, on either side. Daily reports are only ever added or changed, but
+-- a change can still take a floor time away: a day that was deduplicated down to one swipe.
+drop table if exists report_deltas;
+create temp table report_deltas as
+select d.employee_id
+     , d.report_date
+     , d.report_date - (d.report_date + 3) % 7 as week_start
+     , cast(strftime('%s', d.report_date * 86400, 'unixepoch', 'start of month') as integer)
+       / 86400 as month_start
+     , cast(strftime('%Y', d.report_date * 86400, 'unixepoch') as integer) as report_year
+     , o.report_date is not null as old_day
+     , o.total_floor_time_seconds is not null as old_floor_time_day
+     , o.total_floor_time_seconds as old_floor_time
+     , r.report_date is not null as new_day
+     , r.total_floor_time_seconds is not null as new_floor_time_day
+     , r.total_floor_time_seconds as new_floor_time
+     , r.start_time
+     , r.end_time
+from dirty_partitions d
+left join weekly_monthly_totals o on o.employee_id = d.employee_id
+                                 and o.report_date = d.report_date
+left join employee_daily_report r on r.employee_id = d.employee_id
+                                 and r.report_date = d.report_date;
+
+--2. Bring the copy of the changed daily reports up to date, now that their old values are saved.
+-- It's also what the mins and maxes are looked up in when they have to be (see 9).
+INSERT INTO weekly_monthly_totals(employee_id, report_date, week_start, month_start, start_time,
+                                  end_time, total_floor_time_seconds)
+select employee_id
+     , report_date
+     , week_start
+     , month_start
+     , start_time
+     , end_time
+     , new_floor_time
+from report_deltas
+where new_day
+on conflict(employee_id, report_date) do update
+    set start_time = excluded.start_time
+      , end_time = excluded.end_time
+      , total_floor_time_seconds = excluded.total_floor_time_seconds;
+
+--3. Add the changes to the total, annual floor time of each changed employee and year. The
+-- number of days with a floor time is kept along with it, so that the total is NULL (as sum()
+-- would have it) while there are none.
+INSERT INTO total_annual_floor_time(employee_id, report_year, yearly_floor_time, floor_time_days)
+select c.employee_id
+     , c.report_year
+     , case when coalesce(t.floor_time_days, 0) + c.floor_time_days > 0
+            then coalesce(t.yearly_floor_time, 0) + c.floor_time
+       end as yearly_floor_time
+     , coalesce(t.floor_time_days, 0) + c.floor_time_days as floor_time_days
+from (
     select employee_id
+         , report_year
+         , sum(coalesce(new_floor_time, 0) - coalesce(old_floor_time, 0)) as floor_time
+         , sum(new_floor_time_day - old_floor_time_day) as floor_time_days
+    from report_deltas
+    group by employee_id, report_year
+) c
+left join total_annual_floor_time t on t.employee_id = c.employee_id
+                                   and t.report_year = c.report_year
+where true
+on conflict(employee_id, report_year) do update
+    set yearly_floor_time = excluded.yearly_floor_time
+      , floor_time_days = excluded.floor_time_days;
+
+--4. Retrieve the employees that had the most and least amount of time for each changed year. A
+-- changed total can move anyone's rank within its year, so each changed year is ranked again
+-- in full, reading one row per employee from the (report_year, yearly_floor_time) index. The
+-- years that didn't change are left alone. Ties are broken by employee_id so that the same
+-- totals always give the same ranks.
+delete from best_worst_25
+where report_year in (select report_year from report_deltas);
+
+INSERT INTO best_worst_25(employee_id, report_year, yearly_floor_time_seconds,
+                          yearly_floor_time_hours, rank_best, rank_worst)
+with ranked as (
+    select employee_id
+         , report_year
          , yearly_floor_time
-         , row_number() over (order by yearly_floor_time desc) as rank_best
-         , row_number() over (order by yearly_floor_time) as rank_worst
-    from t1
-    order by yearly_floor_time desc
+         , row_number() over (partition by report_year
+                              order by yearly_floor_time desc, employee_id) as rank_best
+         , row_number() over (partition by report_year
+                              order by yearly_floor_time, employee_id) as rank_worst
+    from total_annual_floor_time
+    where report_year in (select report_year from report_deltas)
 )
 select employee_id
+     , report_year
      , yearly_floor_time as yearly_floor_time_seconds
      , yearly_floor_time / 60 / 60  as yearly_floor_time_hours
      , rank_best
@@ -32,26 +118,41 @@ from ranked
 where rank_best <= 25
 or rank_worst <= 25;
 
---3. Create a table that counts the number of total days worked, defined by anyone who had a
--- record on anyday, even if they only worked for 3 minutes (which is the lowest they could
--- theoretically work based on the way I randomly generated data).
-drop table if exists attendance;
-create table attendance as
+--5. Count the number of total days worked by each changed employee in each year, defined by
+-- anyone who had a record on anyday, even if they only worked for 3 minutes (which is the lowest
+-- they could theoretically work based on the way I randomly generated data). Only the days that
+-- are new to the reports add to the count.
+INSERT INTO attendance(employee_id, report_year, total_days)
+select c.employee_id
+     , c.report_year
+     , coalesce(a.total_days, 0) + c.total_days as total_days
+from (
     select employee_id
-         , count(report_date) as total_days
-    from employee_daily_report
-    group by employee_id;
+         , report_year
+         , sum(new_day - old_day) as total_days
+    from report_deltas
+    group by employee_id, report_year
+) c
+left join attendance a on a.employee_id = c.employee_id
+                      and a.report_year = c.report_year
+where true
+on conflict(employee_id, report_year) do update
+    set total_days = excluded.total_days;
 
---4. Rank the attendance by highest and lowest number of days attended:
+--6. Rank the attendance by highest and lowest number of days attended in each changed year, the
+-- same way as 4:
 with ranked as (
     select employee_id
+         , report_year
          , total_days
-         , row_number() over (order by total_days desc ) as best_attendance
-         , row_number() over (order by total_days )      as worst_attendance
+         , row_number() over (partition by report_year order by total_days desc ) as best_attendance
+         , row_number() over (partition by report_year order by total_days )      as worst_attendance
     from attendance
-    order by best_attendance
+    where report_year in (select report_year from report_deltas)
+    order by report_year, best_attendance
 )
 select employee_id
+     , report_year
      , total_days
      , best_attendance
      , worst_attendance
@@ -59,36 +160,141 @@ from ranked
 where best_attendance <= 25
 or worst_attendance <= 25;
 
---5. Add week/month to the report:
-drop table if exists weekly_monthly_totals;
-create table weekly_monthly_totals as
-select employee_id
-     , report_date
-     , strftime('%W', report_date) as week_num
-     , strftime('%m', report_date) as month_num
-     , start_time
-     , end_time
-     , total_floor_time_seconds
-from employee_daily_report;
-
---6. Aggregate the floor time to the month level of granularity:
-drop table if exists monthly_aggregate;
-create table monthly_aggregate as
-select month_num,
-       avg(total_floor_time_seconds) as average_floor_time_seconds,
-       sum(total_floor_time_seconds) as total_floor_time_seconds,
-       min(total_floor_time_seconds) as min_floor_time_seconds,
-       max(total_floor_time_seconds) as max_floor_time_seconds
-from weekly_monthly_totals
-group by month_num;
-
---7. Aggregate the floor time to the week level of granularity:L
-drop table if exists weekly_aggregate;
-create table weekly_aggregate as
-select week_num,
-       avg(total_floor_time_seconds) as average_floor_time_seconds,
-       sum(total_floor_time_seconds) as total_floor_time_seconds,
-       min(total_floor_time_seconds) as min_floor_time_seconds,
-       max(total_floor_time_seconds) as max_floor_time_seconds
-from weekly_monthly_totals
-group by week_num;
\ No newline at end of file
+--7. Add the changes to the floor time of each changed month. The sum and count take the
+-- difference; the min is the lower of the stored min and the new values, and the max the
+-- higher. That's only wrong if the day that held the stored min had its floor time removed or
+-- raised (lowest_removed), and no new value is as low. Then the month's min is looked up again
+-- (see 9), and the same goes for the max.
+drop table if exists monthly_changes;
+create temp table monthly_changes as
+select c.month_start
+     , coalesce(a.total_floor_time_seconds, 0) + c.floor_time as total_floor_time_seconds
+     , coalesce(a.floor_time_days, 0) + c.floor_time_days as floor_time_days
+     , coalesce(min(a.min_floor_time_seconds, c.new_min), a.min_floor_time_seconds, c.new_min)
+       as min_floor_time_seconds
+     , coalesce(max(a.max_floor_time_seconds, c.new_max), a.max_floor_time_seconds, c.new_max)
+       as max_floor_time_seconds
+     , coalesce(c.lowest_removed = a.min_floor_time_seconds, 0)
+       and not coalesce(c.new_min <= a.min_floor_time_seconds, 0) as rescan_min
+     , coalesce(c.highest_removed = a.max_floor_time_seconds, 0)
+       and not coalesce(c.new_max >= a.max_floor_time_seconds, 0) as rescan_max
+from (
+    select month_start
+         , sum(coalesce(new_floor_time, 0) - coalesce(old_floor_time, 0)) as floor_time
+         , sum(new_floor_time_day - old_floor_time_day) as floor_time_days
+         , min(new_floor_time) as new_min
+         , max(new_floor_time) as new_max
+         , min(case when new_floor_time is null or new_floor_time > old_floor_time
+                    then old_floor_time end) as lowest_removed
+         , max(case when new_floor_time is null or new_floor_time < old_floor_time
+                    then old_floor_time end) as highest_removed
+    from report_deltas
+    group by month_start
+) c
+left join monthly_aggregate a on a.month_start = c.month_start;
+
+INSERT INTO monthly_aggregate(month_start, average_floor_time_seconds, total_floor_time_seconds,
+                              min_floor_time_seconds, max_floor_time_seconds, floor_time_days)
+select month_start
+     , cast(total_floor_time_seconds as real) / nullif(floor_time_days, 0)
+     , case when floor_time_days > 0 then total_floor_time_seconds end
+     , min_floor_time_seconds
+     , max_floor_time_seconds
+     , floor_time_days
+from monthly_changes
+where true
+on conflict(month_start) do update
+    set average_floor_time_seconds = excluded.average_floor_time_seconds
+      , total_floor_time_seconds = excluded.total_floor_time_seconds
+      , min_floor_time_seconds = excluded.min_floor_time_seconds
+      , max_floor_time_seconds = excluded.max_floor_time_seconds
+      , floor_time_days = excluded.floor_time_days;
+
+--8. Add the changes to the floor time of each changed week, the same way:
+drop table if exists weekly_changes;
+create temp table weekly_changes as
+select c.week_start
+     , coalesce(a.total_floor_time_seconds, 0) + c.floor_time as total_floor_time_seconds
+     , coalesce(a.floor_time_days, 0) + c.floor_time_days as floor_time_days
+     , coalesce(min(a.min_floor_time_seconds, c.new_min), a.min_floor_time_seconds, c.new_min)
+       as min_floor_time_seconds
+     , coalesce(max(a.max_floor_time_seconds, c.new_max), a.max_floor_time_seconds, c.new_max)
+       as max_floor_time_seconds
+     , coalesce(c.lowest_removed = a.min_floor_time_seconds, 0)
+       and not coalesce(c.new_min <= a.min_floor_time_seconds, 0) as rescan_min
+     , coalesce(c.highest_removed = a.max_floor_time_seconds, 0)
+       and not coalesce(c.new_max >= a.max_floor_time_seconds, 0) as rescan_max
+from (
+    select week_start
+         , sum(coalesce(new_floor_time, 0) - coalesce(old_floor_time, 0)) as floor_time
+         , sum(new_floor_time_day - old_floor_time_day) as floor_time_days
+         , min(new_floor_time) as new_min
+         , max(new_floor_time) as new_max
+         , min(case when new_floor_time is null or new_floor_time > old_floor_time
+                    then old_floor_time end) as lowest_removed
+         , max(case when new_floor_time is null or new_floor_time < old_floor_time
+                    then old_floor_time end) as highest_removed
+    from report_deltas
+    group by week_start
+) c
+left join weekly_aggregate a on a.week_start = c.week_start;
+
+INSERT INTO weekly_aggregate(week_start, average_floor_time_seconds, total_floor_time_seconds,
+                             min_floor_time_seconds, max_floor_time_seconds, floor_time_days)
+select week_start
+     , cast(total_floor_time_seconds as real) / nullif(floor_time_days, 0)
+     , case when floor_time_days > 0 then total_floor_time_seconds end
+     , min_floor_time_seconds
+     , max_floor_time_seconds
+     , floor_time_days
+from weekly_changes
+where true
+on conflict(week_start) do update
+    set average_floor_time_seconds = excluded.average_floor_time_seconds
+      , total_floor_time_seconds = excluded.total_floor_time_seconds
+      , min_floor_time_seconds = excluded.min_floor_time_seconds
+      , max_floor_time_seconds = excluded.max_floor_time_seconds
+      , floor_time_days = excluded.floor_time_days;
+
+--9. Look up the mins and maxes that a change may have taken away. Each is a single seek on the
+-- (month_start, total_floor_time_seconds) or (week_start, total_floor_time_seconds) index of
+-- weekly_monthly_totals, which already holds the new values.
+update monthly_aggregate
+set min_floor_time_seconds = (
+    select min(t.total_floor_time_seconds)
+    from weekly_monthly_totals t
+    where t.month_start = monthly_aggregate.month_start
+)
+where month_start in (select month_start from monthly_changes where rescan_min);
+
+update monthly_aggregate
+set max_floor_time_seconds = (
+    select max(t.total_floor_time_seconds)
+    from weekly_monthly_totals t
+    where t.month_start = monthly_aggregate.month_start
+)
+where month_start in (select month_start from monthly_changes where rescan_max);
+
+update weekly_aggregate
+set min_floor_time_seconds = (
+    select min(t.total_floor_time_seconds)
+    from weekly_monthly_totals t
+    where t.week_start = weekly_aggregate.week_start
+)
+where week_start in (select week_start from weekly_changes where rescan_min);
+
+update weekly_aggregate
+set max_floor_time_seconds = (
+    select max(t.total_floor_time_seconds)
+    from weekly_monthly_totals t
+    where t.week_start = weekly_aggregate.week_start
+)
+where week_start in (select week_start from weekly_changes where rescan_max);
+
+--The reports are now up to date with every dirty partition:
+delete from dirty_partitions;
+
+--Clean up:
+drop table if exists report_deltas;
+drop table if exists monthly_changes;
+drop table if exists weekly_changes;
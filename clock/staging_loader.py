@@ -0,0 +1,123 @@
+import datetime
+import time
+
+from clock.indexes import create_indexes
+
+STAGING_TABLE = "clock_staging"
+
+CREATE_STAGING_TABLE = f"""
+create table {STAGING_TABLE} (
+    employee_id INTEGER NOT NULL,
+    clock_time TIMESTAMP NOT NULL
+);
+"""
+
+INSERT_STAGING_ROW = f"insert into {STAGING_TABLE} (employee_id, clock_time) values (?, ?);"
+
+# PRAGMAs that are only safe because the staging table is rebuilt from the file on every run.
+# If the load dies halfway through, we simply load it again. The journal mode is left alone if
+# the database is already in WAL mode (see config.SQLITE_PROFILES); WAL is already fast to load
+# into, and leaving it needs exclusive access, which other pooled connections would block.
+LOAD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -262144,
+}
+
+
+class StagingLoader:
+    """
+    Loads the staging table directly through the DB-API connection rather than through
+    DataFrame.to_sql. The table is created with explicit types (no pandas index column),
+    rows are inserted with executemany in batches inside of a single transaction, and the
+    indexes are created once all of the data is in.
+
+    While loading, the LOAD_PRAGMAS are applied to the connection and the previous values are
+    restored afterwards so that nothing else runs with durability turned off.
+    """
+
+    def __init__(self, engine, pragmas=None):
+        self.engine = engine
+        self.pragmas = LOAD_PRAGMAS if pragmas is None else pragmas
+        self.rows = 0
+        self.seconds = 0.0
+
+    def load(self, batches):
+        """
+        Drop and recreate the staging table and insert every batch into it.
+
+        :param batches: An iterable of batches, each a list of (employee_id, clock_time) tuples.
+        :return: The number of rows loaded.
+        :rtype: int
+        """
+        start = time.perf_counter()
+        self.rows = 0
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            pragmas = dict(self.pragmas)
+            if cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "wal":
+                pragmas.pop("journal_mode", None)
+            previous_pragmas = self.apply_pragmas(cursor, pragmas)
+            try:
+                cursor.execute("BEGIN")
+                cursor.execute(f"drop table if exists {STAGING_TABLE};")
+                cursor.execute(CREATE_STAGING_TABLE)
+                for batch in batches:
+                    cursor.executemany(INSERT_STAGING_ROW, batch)
+                    self.rows += len(batch)
+
+                # Building an index once over the loaded data is far cheaper than maintaining
+                # it for every inserted row.
+                create_indexes(cursor, STAGING_TABLE)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                self.apply_pragmas(cursor, previous_pragmas)
+        finally:
+            connection.close()
+
+        self.seconds = time.perf_counter() - start
+        print(
+            f"...loaded {self.rows} rows into {STAGING_TABLE} in {self.seconds:.2f}s "
+            f"({self.rows_per_second():,.0f} rows/sec). {datetime.datetime.utcnow()}"
+        )
+        return self.rows
+
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @staticmethod
+    def apply_pragmas(cursor, pragmas):
+        """
+        Set each of the PRAGMAs on the connection, returning whatever they were set to before
+        so that they can be put back.
+
+        :param cursor: A DB-API cursor
+        :param pragmas: A dict of PRAGMA name to value
+        :return: A dict of the previous PRAGMA values
+        :rtype: dict
+        """
+        previous = {}
+        for name, value in pragmas.items():
+            previous[name] = cursor.execute(f"PRAGMA {name};").fetchone()[0]
+            cursor.execute(f"PRAGMA {name} = {value};")
+        return previous
+
+
+def dataframe_batches(df, batch_size=100000):
+    """
+    Split a dataframe with employee_id and clock_time columns into lists of tuples for
+    StagingLoader.load. Converting a slice at a time keeps us from having a second copy of the
+    whole file in memory as Python objects.
+
+    :param df: The dataframe to split.
+    :param batch_size: The number of rows per batch.
+    :return: A generator of lists of (employee_id, clock_time) tuples.
+    """
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        yield list(zip(batch["employee_id"].tolist(), batch["clock_time"].tolist()))
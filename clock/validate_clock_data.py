@@ -0,0 +1,213 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from clock.config import connect
+from clock import clock_models
+from clock.clock_models import SECONDS_PER_DAY
+from clock.instrumentation import current_span, span, timed
+from clock.sessionize import Sessionize
+
+# The reason codes a partition (an employee/day) can be quarantined for. A partition can fail
+# more than one rule, so each rule is a bit and the reasons are stored as a comma separated list.
+RULES = (
+    "odd_swipe_count",
+    "duplicate_swipe",
+    "overlapping_swipe",
+    "crosses_midnight",
+    "unknown_employee",
+)
+RULE_BITS = {rule: 1 << i for i, rule in enumerate(RULES)}
+
+INSERT_QUARANTINE = """
+insert into clock_quarantine (employee_id, report_date, clock_time, reasons, quarantined_at)
+values (?, ?, ?, ?, ?);
+"""
+
+# The staging table is indexed on (employee_id, clock_time), so each partition is deleted with a
+# range search rather than a scan.
+DELETE_STAGED_PARTITION = """
+delete from clock_staging
+where employee_id = ?
+  and clock_time >= ?
+  and clock_time < date(?, '+1 day');
+"""
+
+
+class ValidateStaging:
+    """
+    Checks the staged swipes for the problems that the transform would otherwise paper over, and
+    moves every employee/day that has one out of the staging table and into clock_quarantine
+    before the transform sees it:
+
+    * odd_swipe_count: an odd number of swipes, so the last clock-in has no clock-out and its
+      time would silently be dropped
+    * duplicate_swipe: the same swipe more than once, which would pair a swipe with itself
+    * overlapping_swipe: a second swipe less than MIN_SWIPE_SECONDS after the one before it,
+      which is almost always a double read of the same card
+    * crosses_midnight: an odd day followed by an odd next day, which is what a shift that runs
+      past midnight looks like once the swipes are split by day
+    * unknown_employee: an employee that isn't in the employee table. The pipeline adds
+      employees from the swipes themselves, so this is only checked if the employee table is
+      maintained elsewhere (known_employees_only).
+
+    All of the rules are checked in one pass: the swipes are read and sorted by employee and
+    clock time once (the same as Sessionize), and then each rule is an array comparison of the
+    swipes, or the employee/days, with their neighbours. This assumes that the staging table
+    holds whole days of swipes.
+    """
+    MIN_SWIPE_SECONDS = 60
+
+    def __init__(self, engine, session, known_employees_only=False):
+        """
+        :param engine: A SQLAlchemy engine
+        :param session: A SQLAlchemy session object
+        :param known_employees_only: Quarantine the swipes of employees that aren't already in
+            the employee table.
+        """
+        self.engine = engine
+        self.session = session
+        self.known_employees_only = known_employees_only
+        self.df = None
+        self.group_starts = None
+        self.flags = None
+
+    def execute(self):
+        self.read_staging_table()
+        self.check_rules()
+        self.quarantine()
+
+    @timed
+    def read_staging_table(self):
+        """
+        Read the staged swipes sorted by employee and clock time, and group them by employee/day,
+        using the same steps as Sessionize.
+
+        :return: None
+        """
+        sessionize = Sessionize(self.engine)
+        sessionize.read_staging_table()
+        sessionize.number_clock_ins()
+        self.df = sessionize.df
+        self.group_starts = sessionize.group_starts
+        current_span()["rows"] = len(self.df)
+
+    @timed
+    def check_rules(self):
+        """
+        Set a bit in self.flags for every rule that each employee/day breaks.
+
+        :return: None
+        """
+        employee_id = self.df["employee_id"].values
+        epoch = self.df["epoch"].values
+        day = self.df["day"].values
+        group = self.df["group"].values
+        group_count = len(self.group_starts)
+        flags = np.zeros(group_count, dtype=np.int64)
+
+        swipes = np.diff(np.append(self.group_starts, len(self.df)))
+        odd = swipes % 2 == 1
+        flags[odd] |= RULE_BITS["odd_swipe_count"]
+
+        # Rules about a swipe and the swipe before it in the same employee/day.
+        same_group = group[1:] == group[:-1]
+        gap = epoch[1:] - epoch[:-1]
+        flags[group[1:][same_group & (gap == 0)]] |= RULE_BITS["duplicate_swipe"]
+        overlapping = same_group & (gap > 0) & (gap < self.MIN_SWIPE_SECONDS)
+        flags[group[1:][overlapping]] |= RULE_BITS["overlapping_swipe"]
+
+        # Rules about an employee/day and the employee/day after it.
+        group_employee_id = employee_id[self.group_starts]
+        group_day = day[self.group_starts]
+        crosses_midnight = (
+            odd[:-1] & odd[1:]
+            & (group_employee_id[1:] == group_employee_id[:-1])
+            & (group_day[1:] == group_day[:-1] + 1)
+        )
+        flags[:-1][crosses_midnight] |= RULE_BITS["crosses_midnight"]
+        flags[1:][crosses_midnight] |= RULE_BITS["crosses_midnight"]
+
+        if self.known_employees_only:
+            known = np.array(
+                [row[0] for row in self.session.query(clock_models.Employee.employee_id)]
+            )
+            flags[~np.isin(group_employee_id, known)] |= RULE_BITS["unknown_employee"]
+
+        self.flags = flags
+
+    @timed
+    def quarantine(self):
+        """
+        Copy the swipes of every flagged employee/day into clock_quarantine along with the
+        reasons, and delete them from the staging table, in one transaction. The number of
+        employee/days that broke each rule is published as a span of its own.
+
+        :return: None
+        """
+        flagged = np.flatnonzero(self.flags)
+        for rule in RULES:
+            with span("quarantine_rule", rule=rule) as s:
+                s["rows"] = int(np.count_nonzero(self.flags & RULE_BITS[rule]))
+                print(f"...{s['rows']} employee/days failed {rule}. "
+                      f"{datetime.datetime.utcnow()}")
+        current_span()["rows"] = len(flagged)
+        if not len(flagged):
+            return
+
+        reasons = {
+            value: ",".join(rule for rule in RULES if value & RULE_BITS[rule])
+            for value in np.unique(self.flags[flagged])
+        }
+        swipes = self.df[self.flags[self.df["group"].values] != 0]
+        quarantined_at = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        rows = zip(
+            swipes["employee_id"].tolist(),
+            _report_dates(swipes["day"]),
+            swipes["clock_time"].tolist(),
+            [reasons[value] for value in self.flags[swipes["group"].values]],
+            [quarantined_at] * len(swipes),
+        )
+        partitions = self.df.iloc[self.group_starts[flagged]]
+        report_dates = _report_dates(partitions["day"])
+        ranges = zip(partitions["employee_id"].tolist(), report_dates, report_dates)
+
+        print(f"...quarantining {len(swipes)} swipes from {len(flagged)} employee/days. "
+              f"{datetime.datetime.utcnow()}")
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN")
+            cursor.executemany(INSERT_QUARANTINE, rows)
+            cursor.executemany(DELETE_STAGED_PARTITION, ranges)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+
+def _report_dates(days):
+    """
+    :param days: Days since 1970-01-01.
+    :return: The days as ISO dates, the same as the dates in the staging table.
+    :rtype: list
+    """
+    return pd.to_datetime(days.values * SECONDS_PER_DAY, unit="s").strftime("%Y-%m-%d").tolist()
+
+
+def main(known_employees_only=False):
+    """
+    Validate the staging table, quarantining anything that shouldn't be transformed.
+
+    :param known_employees_only: See ValidateStaging.
+    :return: None
+    """
+    print("Validating Clock Data...")
+    engine, session = connect()
+    clock_models.create_models(engine=engine, session=session)
+
+    v = ValidateStaging(engine, session, known_employees_only=known_employees_only)
+    v.execute()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from parenthenesis_parser.file_validator import validate_file
+from parenthenesis_parser.incremental import IncrementalParser
+from parenthenesis_parser.parser import ParenthesisParser, is_balanced, parse_many
+
+
+def check_with_stack(strings, encoded):
+    parser = ParenthesisParser()
+    return [parser.parse_with_stack(string) for string in strings]
+
+
+def check_with_parse(strings, encoded):
+    return [is_balanced(string) for string in strings]
+
+
+def check_bytes_with_parse(strings, encoded):
+    return [is_balanced(string) for string in encoded]
+
+
+def check_with_parse_many(strings, encoded):
+    return parse_many(strings)
+
+
+def check_with_incremental(strings, encoded):
+    return [IncrementalParser(string).is_balanced() for string in strings]
+
+
+# Each implementation is given the corpus as strs and as bytes (so that encoding isn't part of
+# the time), and returns whether each string is balanced.
+IMPLEMENTATIONS = {
+    "stack": check_with_stack,
+    "parse": check_with_parse,
+    "parse_bytes": check_bytes_with_parse,
+    "parse_many": check_with_parse_many,
+    "incremental": check_with_incremental,
+}
+
+
+def run_benchmark(strings, implementations=None, repeat=3, file_workers=None):
+    """
+    Times every implementation over the same corpus and checks that they all agree. Each one is
+    run repeat times and the fastest is kept, which is the one least disturbed by whatever else
+    the machine was doing.
+
+    validate_file is timed on the corpus written out one string per line. It gives one verdict
+    for the whole file rather than one per string, so it isn't checked against the others, but
+    its MB/sec is directly comparable.
+
+    :param strings: The corpus, as a list of strs.
+    :param implementations: The names of the implementations to run. Defaults to all of them,
+        plus "validate_file".
+    :param repeat: How many times to run each implementation.
+    :param file_workers: The number of processes for validate_file.
+    :return: One result per implementation, with its strings/sec and MB/sec.
+    :rtype: list
+    """
+    implementations = implementations or [*IMPLEMENTATIONS, "validate_file"]
+    encoded = [string.encode() for string in strings]
+    megabytes = sum(map(len, encoded)) / 1e6
+    expected = None
+    results = []
+
+    for name in implementations:
+        if name == "validate_file":
+            seconds = time_validate_file(encoded, repeat, file_workers)
+        else:
+            seconds, verdicts = float("inf"), None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                verdicts = IMPLEMENTATIONS[name](strings, encoded)
+                seconds = min(seconds, time.perf_counter() - start)
+
+            verdicts = np.asarray(verdicts, dtype=bool)
+            if expected is None:
+                expected = verdicts
+            elif not np.array_equal(verdicts, expected):
+                raise AssertionError(
+                    f"{name} disagrees with {implementations[0]} on "
+                    f"{np.count_nonzero(verdicts != expected)} strings."
+                )
+
+        results.append({
+            "implementation": name,
+            "strings": len(strings),
+            "megabytes": megabytes,
+            "seconds": seconds,
+            "strings_per_second": len(strings) / seconds,
+            "megabytes_per_second": megabytes / seconds,
+        })
+    return results
+
+
+def time_validate_file(encoded, repeat, workers):
+    """
+    :return: The fastest of repeat runs of validate_file over the corpus, one string per line.
+    :rtype: float
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        with open(path, "wb") as f:
+            f.write(b"\n".join(encoded))
+
+        seconds = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            validate_file(path, workers=workers)
+            seconds = min(seconds, time.perf_counter() - start)
+    return seconds
+
+
+def format_results(results):
+    """
+    :param results: The output of run_benchmark.
+    :return: A table of the results, fastest first.
+    :rtype: str
+    """
+    lines = [f"{'implementation':<16}{'strings/sec':>16}{'MB/sec':>12}{'seconds':>10}"]
+    for result in sorted(results, key=lambda result: result["seconds"]):
+        lines.append(
+            f"{result['implementation']:<16}{result['strings_per_second']:>16,.0f}"
+            f"{result['megabytes_per_second']:>12,.1f}{result['seconds']:>10.3f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,100 @@
+import random
+
+from parenthenesis_parser.parser import OPEN, CLOSE
+
+
+def generate(count, min_length=2, max_length=100, nesting=0.5, max_depth=None, unbalanced=0.5,
+             seed=None):
+    """
+    Generates strings of parenthesis to test and benchmark the parsers with, one at a time, so
+    that a corpus of any size can be written out without holding it in memory.
+
+    Every string starts out balanced (see balanced_string), and a share of them are then made
+    unbalanced (see unbalance). The lengths are spread evenly between min_length and max_length,
+    and how deep the strings go is up to nesting and max_depth.
+
+    :param count: The number of strings.
+    :param min_length: The shortest a string can be.
+    :param max_length: The longest a string can be.
+    :param nesting: The chance of opening, rather than closing, whenever there's a choice. The
+        higher it is, the deeper the strings go; 0.5 is a random walk.
+    :param max_depth: The deepest a string can go, if anything.
+    :param unbalanced: The share of the strings that are unbalanced.
+    :param seed: The seed for the generator, so that a corpus can be made again.
+    :return: A generator of strings.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        length = rng.randint(min_length, max_length)
+        string = balanced_string(rng, length - length % 2, nesting, max_depth)
+        if rng.random() < unbalanced:
+            string = unbalance(rng, string)
+        yield string
+
+
+def balanced_string(rng, length, nesting=0.5, max_depth=None):
+    """
+    A random walk of the depth that has to end where it started. It has to open when it is at
+    zero, and close when it is at max_depth or when it is as deep as there are characters left;
+    otherwise it opens with a chance of nesting.
+
+    :param rng: A random.Random.
+    :param length: The length of the string, which has to be even.
+    :param nesting: The chance of opening whenever there's a choice.
+    :param max_depth: The deepest the string can go, if anything.
+    :return: A balanced string.
+    :rtype: str
+    """
+    characters = []
+    depth = 0
+    for remaining in range(length, 0, -1):
+        if depth == 0:
+            opening = True
+        elif depth == remaining or (max_depth and depth >= max_depth):
+            opening = False
+        else:
+            opening = rng.random() < nesting
+        characters.append(OPEN if opening else CLOSE)
+        depth += 1 if opening else -1
+    return "".join(characters)
+
+
+def unbalance(rng, string):
+    """
+    Breaks a balanced string in one of three ways, from the obvious to the subtle:
+
+    * flip one parenthesis, so there are more of one than the other
+    * drop one parenthesis, so the length is odd
+    * turn a group at the top level, other than the first or the last, inside out: "(...)"
+      becomes ")...(". The opens and closes still match and the string still starts with an
+      opening and ends with a closing, but the depth goes below zero in the middle. Only a full
+      parse catches this one.
+
+    :param rng: A random.Random.
+    :param string: A balanced string.
+    :return: An unbalanced string.
+    :rtype: str
+    """
+    if not string:
+        return CLOSE
+
+    how = rng.choice(("flip", "drop", "swap"))
+    if how == "swap":
+        # The (start, end) of every group at the top level.
+        groups = []
+        depth = 0
+        start = 0
+        for i, character in enumerate(string):
+            depth += 1 if character == OPEN else -1
+            if depth == 0:
+                groups.append((start, i))
+                start = i + 1
+        if len(groups) > 2:
+            start, end = rng.choice(groups[1:-1])
+            return string[:start] + CLOSE + string[start + 1:end] + OPEN + string[end + 1:]
+        how = "flip"
+
+    i = rng.randrange(len(string))
+    if how == "drop":
+        return string[:i] + string[i + 1:]
+    return string[:i] + (CLOSE if string[i] == OPEN else OPEN) + string[i + 1:]
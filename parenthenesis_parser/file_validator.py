@@ -0,0 +1,136 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from parenthenesis_parser.parser import OPEN_BYTE, CLOSE_BYTE
+
+# Each worker is handed a chunk of the file this size...
+CHUNK_SIZE = 64 * 1024 * 1024
+# ...and reads it this much at a time, which is all that it ever holds in memory (plus the depths
+# of the block, four times its size).
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def validate_file(path, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Checks whether the parenthesis in a file are balanced without reading it into memory, so it
+    works for files far bigger than memory, such as serialized trees or log dumps.
+
+    Balance doesn't have to be checked from the start: any stretch of the file can be reduced to
+    two numbers, its net depth (opens minus closes) and its lowest depth along the way, starting
+    from zero. Two stretches side by side combine into one without looking at them again (see
+    combine), so the file is split into chunks, every chunk is reduced in its own process (see
+    summarize_chunk), and the results are combined in order. The file is memory-mapped rather
+    than read, so the workers share the operating system's page cache rather than each copying
+    their chunk.
+
+    The combined result says whether the file is balanced. If it isn't, the first chunk whose
+    lowest depth drops below zero (counting from where the chunks before it left off) holds the
+    first unmatched closing parenthesis, and only that chunk is read again to find it.
+
+    :param path: The file to check.
+    :param workers: The number of processes. Defaults to the number of CPUs.
+    :param chunk_size: The number of bytes that each worker reduces at a time.
+    :return: Whether the file is balanced, and the byte offset of the first unmatched closing
+        parenthesis, the size of the file if it ends with unclosed openings, or -1 if it's
+        balanced.
+    :rtype: tuple
+    """
+    size = os.path.getsize(path)
+    starts = list(range(0, size, chunk_size))
+    ends = [min(start + chunk_size, size) for start in starts]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        summaries = list(executor.map(summarize_chunk, repeat(path), starts, ends))
+
+    total = (0, 0)
+    for start, end, summary in zip(starts, ends, summaries):
+        depth = total[0]
+        total = combine(total, summary)
+        if total[1] < 0:
+            return False, find_first_violation(path, start, end, depth)
+
+    if total[0]:
+        return False, size
+    return True, -1
+
+
+def combine(left, right):
+    """
+    Combines the summaries of two stretches of a file, the left one immediately before the
+    right. The right one's depths all start where the left one left off, so its lowest depth
+    is shifted by the left one's net depth. This is associative, so the chunks can be combined
+    in any grouping as long as they stay in order.
+
+    :param left: The (net depth, lowest depth) of the first stretch.
+    :param right: The (net depth, lowest depth) of the stretch right after it.
+    :return: The (net depth, lowest depth) of both together.
+    :rtype: tuple
+    """
+    left_net, left_lowest = left
+    right_net, right_lowest = right
+    return left_net + right_net, min(left_lowest, left_net + right_lowest)
+
+
+def summarize_chunk(path, start, end):
+    """
+    Worker for validate_file. This has to live at the module level so that it can be pickled
+    and sent to the process pool. Each worker maps the file on its own; a memory map can't be
+    sent between processes.
+
+    :param path: The file to check.
+    :param start: The offset of the first byte of the chunk.
+    :param end: The offset just past the last byte of the chunk.
+    :return: The (net depth, lowest depth) of the chunk, starting from a depth of zero.
+    :rtype: tuple
+    """
+    net, lowest = 0, 0
+    for _, depths in _block_depths(path, start, end):
+        lowest = min(lowest, net + int(depths.min()))
+        net += int(depths[-1])
+    return net, lowest
+
+
+def find_first_violation(path, start, end, depth):
+    """
+    Reads a chunk again to find exactly where the depth first drops below zero.
+
+    :param path: The file to check.
+    :param start: The offset of the first byte of the chunk.
+    :param end: The offset just past the last byte of the chunk.
+    :param depth: The depth at the start of the chunk.
+    :return: The byte offset of the first unmatched closing parenthesis in the chunk, or -1 if
+        there isn't one.
+    :rtype: int
+    """
+    for block_start, depths in _block_depths(path, start, end):
+        below_zero = np.flatnonzero(depths < -depth)
+        if len(below_zero):
+            return block_start + int(below_zero[0])
+        depth += int(depths[-1])
+    return -1
+
+
+def _block_depths(path, start, end):
+    """
+    Maps the file and yields the depth after every byte of each block of a chunk, relative to
+    the start of that block. The array of bytes is a view of the map rather than a copy, and
+    it's released before the next block (and before the map is closed, which fails while a
+    view of it exists).
+
+    :return: A generator of (offset of the block, depths) tuples.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if hasattr(m, "madvise"):
+            # The advice has to start on a page boundary.
+            page_start = start - start % mmap.PAGESIZE
+            m.madvise(mmap.MADV_SEQUENTIAL, page_start, end - page_start)
+        for block_start in range(start, end, BLOCK_SIZE):
+            block = np.frombuffer(m, dtype=np.uint8, offset=block_start,
+                                  count=min(BLOCK_SIZE, end - block_start))
+            steps = (block == OPEN_BYTE).astype(np.int8) - (block == CLOSE_BYTE)
+            del block
+            yield block_start, np.cumsum(steps, dtype=np.int32)
@@ -0,0 +1,255 @@
+import gc
+import random
+
+from parenthenesis_parser.parser import OPEN, CLOSE
+
+
+class IncrementalParser:
+    """
+    Keeps track of whether a piece of text is balanced while it is being edited, without
+    checking the whole text again after every edit.
+
+    Any stretch of text can be summed up by its net depth (opens minus closes), and the lowest
+    and highest depths it reaches from a depth of zero. The summary of two stretches side by
+    side comes straight from the summaries of each (see _Node.update). So the text is kept in a
+    balanced binary tree, one character per node in reading order, and every node holds the
+    summary of its subtree. Then:
+
+    * the root's summary is the whole text's, so whether it's balanced and how deep it goes
+      are read straight off of it
+    * the first unmatched closing parenthesis is found by following the summaries down one
+      path from the root
+    * an edit only changes the summaries of the nodes along the path to it
+
+    The tree is a treap: each node also gets a random priority, and the tree is kept in heap
+    order of those, which keeps it balanced (on average) no matter the order of the edits.
+    Inserting, deleting, or replacing k characters in a text of n characters takes
+    O(k + log n), and every query takes O(log n) at most, so checking the text after an edit
+    takes about as long for a book as for a sentence.
+    """
+
+    def __init__(self, text=""):
+        """
+        :param text: The text to start with.
+        """
+        self.root = _build(text)
+
+    def __len__(self):
+        return _size(self.root)
+
+    def __str__(self):
+        characters = []
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            characters.append(node.character)
+            node = node.right
+        return "".join(characters)
+
+    def insert(self, index, text):
+        """
+        :param index: Where to insert the text. The end of the text is len(self).
+        :param text: The text to insert.
+        :return: None
+        """
+        self._check_index(index, len(self))
+        left, right = _split(self.root, index)
+        self.root = _merge(_merge(left, _build(text)), right)
+
+    def delete(self, index, length=1):
+        """
+        :param index: The first character to delete.
+        :param length: The number of characters to delete.
+        :return: None
+        """
+        self._check_index(index, len(self))
+        self._check_index(index + length, len(self))
+        left, rest = _split(self.root, index)
+        _, right = _split(rest, length)
+        self.root = _merge(left, right)
+
+    def replace(self, index, text):
+        """
+        Overwrite the characters starting at index with the text.
+
+        :param index: The first character to overwrite.
+        :param text: The text to put in their place.
+        :return: None
+        """
+        self._check_index(index, len(self))
+        self._check_index(index + len(text), len(self))
+        left, rest = _split(self.root, index)
+        _, right = _split(rest, len(text))
+        self.root = _merge(_merge(left, _build(text)), right)
+
+    def is_balanced(self):
+        """
+        :return: Whether the whole text is balanced.
+        :rtype: bool
+        """
+        return self.root is None or (self.root.net == 0 and self.root.lowest >= 0)
+
+    def first_error(self):
+        """
+        :return: The index of the first closing parenthesis with nothing to close, the length
+            of the text if it ends with unclosed openings, or -1 if it's balanced. These are the
+            same offsets as parse_many.
+        :rtype: int
+        """
+        node = self.root
+        if node is None:
+            return -1
+        if node.lowest >= 0:
+            return -1 if node.net == 0 else node.size
+
+        # Walk down to the first character where the depth drops to -1. depth and index are the
+        # depth and the number of characters before the current subtree.
+        depth, index = 0, 0
+        while True:
+            left_net, left_lowest, left_size = _summary(node.left)
+            if depth + left_lowest < 0:
+                node = node.left
+                continue
+            depth += left_net + node.step
+            index += left_size
+            if depth < 0:
+                return index
+            index += 1
+            node = node.right
+
+    def max_depth(self):
+        """
+        :return: The deepest that the parenthesis are nested anywhere in the text.
+        :rtype: int
+        """
+        return self.root.highest if self.root else 0
+
+    @staticmethod
+    def _check_index(index, length):
+        if not 0 <= index <= length:
+            raise IndexError(f"{index} is outside of a text of length {length}.")
+
+
+class _Node:
+    __slots__ = (
+        "character", "step", "priority", "left", "right", "size", "net", "lowest", "highest"
+    )
+
+    def __init__(self, character):
+        self.character = character
+        self.step = 1 if character == OPEN else -1 if character == CLOSE else 0
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = 1
+        self.net = self.step
+        self.lowest = min(0, self.step)
+        self.highest = max(0, self.step)
+
+    def update(self):
+        """
+        Recompute this node's summary from its children's. The lowest and highest depths count
+        the empty prefix (a depth of zero), so an empty subtree's are both zero and they can be
+        combined without checking for one.
+
+        :return: None
+        """
+        left, right = self.left, self.right
+        size, net, lowest, highest = 1, self.step, min(0, self.step), max(0, self.step)
+        if left is not None:
+            lowest = min(left.lowest, left.net + lowest)
+            highest = max(left.highest, left.net + highest)
+            net += left.net
+            size += left.size
+        if right is not None:
+            lowest = min(lowest, net + right.lowest)
+            highest = max(highest, net + right.highest)
+            net += right.net
+            size += right.size
+        self.size, self.net, self.lowest, self.highest = size, net, lowest, highest
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _summary(node):
+    return (node.net, node.lowest, node.size) if node else (0, 0, 0)
+
+
+def _build(text):
+    """
+    Build a treap of a text in O(n), rather than inserting one character at a time. With the
+    characters already in order, the tree is just the one that puts them in heap order of their
+    priorities, which one pass with a stack of the right-hand edge of the tree finds. A node's
+    subtree is complete when it is popped off of the stack, so that's when it's updated.
+
+    The garbage collector is paused while the nodes are created. Otherwise it keeps scanning
+    every node made so far, which makes a large build quadratic, and a tree has no cycles for it
+    to find anyway.
+
+    :param text: The text to build a tree of.
+    :return: The root of the tree.
+    :rtype: _Node
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        stack = []
+        for character in text:
+            node = _Node(character)
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+                last.update()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+
+        root = stack[0] if stack else None
+        while stack:
+            stack.pop().update()
+        return root
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _split(node, index):
+    """
+    :return: The trees of the first index characters and of the rest.
+    :rtype: tuple
+    """
+    if node is None:
+        return None, None
+    left_size = _size(node.left)
+    if index <= left_size:
+        left, node.left = _split(node.left, index)
+        node.update()
+        return left, node
+    node.right, right = _split(node.right, index - left_size - 1)
+    node.update()
+    return node, right
+
+
+def _merge(left, right):
+    """
+    :return: The tree of the characters of left followed by those of right.
+    :rtype: _Node
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.update()
+        return left
+    right.left = _merge(left, right.left)
+    right.update()
+    return right
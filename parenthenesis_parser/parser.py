@@ -1,5 +1,112 @@
 import re
 
+import numpy as np
+
+# The characters that the parser cares about, as they appear in a str and as bytes.
+OPEN, CLOSE = "(", ")"
+OPEN_BYTE, CLOSE_BYTE = ord(OPEN), ord(CLOSE)
+
+
+def is_balanced(string):
+    """
+    The fast path behind ParenthesisParser.parse. Rather than sanitizing the string, counting
+    the opens and closes, and then walking a stack, this walks the string once and keeps only a
+    depth: one deeper for every opening parenthesis and one shallower for every closing one.
+    The string is balanced if the depth never goes below zero and ends at zero, so it stops at
+    the first closing parenthesis that has nothing to close. Any other character is skipped, the
+    same as if it had been sanitized away, without making a sanitized copy.
+
+    Bytes and anything else that supports the buffer protocol (bytearray, memoryview, mmap) are
+    read in place as bytes, so a string doesn't have to be decoded before it is checked.
+
+    :param string: A str, bytes, or memoryview.
+    :return: A boolean indicating whether or not the string is balanced.
+    :rtype: bool
+    """
+    if isinstance(string, str):
+        opening, closing = OPEN, CLOSE
+    else:
+        string = memoryview(string).cast("B")
+        opening, closing = OPEN_BYTE, CLOSE_BYTE
+
+    depth = 0
+    for character in string:
+        if character == opening:
+            depth += 1
+        elif character == closing:
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def parse_many(strings, return_offsets=False):
+    """
+    Checks a whole batch of strings at once with NumPy, rather than one call to parse per string.
+    The strings are joined into one buffer of bytes, each opening parenthesis becomes +1 and each
+    closing one -1 (anything else is 0), and a single cumulative sum over the buffer gives the
+    depth after every character of every string. A string's own depths are that, minus the depth
+    at the end of the string before it. It's balanced if its depth ends at zero and its lowest
+    depth (the minimum prefix) never goes below zero, which np.minimum.reduceat finds for every
+    string in one call. There is no Python loop over the characters.
+
+    A str is joined as ASCII with every other character replaced by "?", one for one, so the
+    offsets are still offsets into the original str.
+
+    :param strings: An iterable, or a NumPy array, of strs or of bytes.
+    :param return_offsets: Also return where each string first fails.
+    :return: A boolean array with whether each string is balanced. With return_offsets, a tuple
+        of that and an integer array with the offset of each string's first unmatched closing
+        parenthesis, the length of the string if it ends with unclosed openings, or -1 if it's
+        balanced.
+    :rtype: np.ndarray or tuple
+    """
+    strings = strings.tolist() if isinstance(strings, np.ndarray) else list(strings)
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    if strings and isinstance(strings[0], str):
+        joined = "".join(strings).encode("ascii", "replace")
+    else:
+        joined = b"".join(strings)
+    buffer = np.frombuffer(joined, dtype=np.uint8)
+
+    # Depths can't be deeper than the buffer is long, so int32 is enough for anything under 2GB
+    # and halves the memory of the sum.
+    dtype = np.int32 if len(buffer) < 2 ** 31 else np.int64
+    steps = (buffer == OPEN_BYTE).astype(np.int8) - (buffer == CLOSE_BYTE)
+    depth = np.cumsum(steps, dtype=dtype)
+
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    # The depth just before each string starts, which is where the string's own depth is 0.
+    base = np.zeros(len(strings), dtype=dtype)
+    base[starts > 0] = depth[starts[starts > 0] - 1]
+
+    # An empty string is balanced, and has no depths to reduce (reduceat would give it the depth
+    # of the next string instead), so only the others are reduced.
+    final = np.zeros(len(strings), dtype=dtype)
+    lowest = np.zeros(len(strings), dtype=dtype)
+    non_empty = lengths > 0
+    if non_empty.any():
+        final[non_empty] = depth[ends[non_empty] - 1] - base[non_empty]
+        lowest[non_empty] = np.minimum.reduceat(depth, starts[non_empty]) - base[non_empty]
+    balanced = (final == 0) & (lowest >= 0)
+    if not return_offsets:
+        return balanced
+
+    offsets = np.where(balanced, -1, lengths)
+    # A string that goes below zero first fails at the first character where its depth is -1.
+    # Only the strings that go below zero are looked at, and only the positions where the
+    # depth is -1 relative to one of them.
+    below_zero = np.flatnonzero(lowest < 0)
+    if len(below_zero):
+        string_of = np.repeat(np.arange(len(strings)), lengths)
+        failed = np.zeros(len(strings), dtype=bool)
+        failed[below_zero] = True
+        candidates = np.flatnonzero(failed[string_of] & (depth == base[string_of] - 1))
+        failing, first = np.unique(string_of[candidates], return_index=True)
+        offsets[failing] = candidates[first] - starts[failing]
+    return balanced, offsets
+
 
 def sanitize_string(string):
     """
@@ -19,6 +126,10 @@ class ParenthesisParser:
     balance of the functionality of the parser.  The class itself only exists to maintain
     attributes, which are easier to pass around in this instance as class attributes rather than
     using globals or similar with a functional programming approach.
+
+    parse itself goes straight to is_balanced, which needs none of the attributes. The original,
+    step by step version (sanitize, reject, then stack) is still here as parse_with_stack, which
+    fills in the attributes along the way and is easier to follow.
     """
 
     def __init__(self):
@@ -31,6 +142,27 @@ class ParenthesisParser:
         self.total_close = 0
 
     def parse(self, string):
+        """
+        Checks whether the string is balanced in a single pass; see is_balanced.
+
+        :param string: A str, bytes, or memoryview.
+        :return: A boolean indicating whether or not the string is balanced or not.
+        :rtype: bool
+        """
+        return is_balanced(string)
+
+    def parse_many(self, strings, return_offsets=False):
+        """
+        Checks a batch of strings at once; see parse_many.
+
+        :param strings: An iterable, or a NumPy array, of strs or of bytes.
+        :param return_offsets: Also return where each string first fails.
+        :return: A boolean array, or a tuple of that and the offsets of the first failures.
+        :rtype: np.ndarray or tuple
+        """
+        return parse_many(strings, return_offsets=return_offsets)
+
+    def parse_with_stack(self, string):
         """
         Calling this method resets all of the class attributes and then checks to see if the
         string meets any of the immediate rejection criteria. If the rejection criteria are met,
@@ -108,11 +240,15 @@ class ParenthesisParser:
         :rtype: bool
         """
 
-        # For any even length string, check to see if the inverse position matches:
+        # For any even length string, check to see if the inverse position matches. A closing
+        # with nothing on the stack can still happen here (such as in "())(()"), and means that
+        # it is unbalanced.
         for i, character in enumerate(self.string):
             if character == "(":
                 self.stack.append(character)
             elif character == ")":
+                if not self.stack:
+                    return False
                 self.stack.pop()
 
         if len(self.stack) == 0:
@@ -140,7 +276,7 @@ class ParenthesisParser:
 
         :return: None
         """
-        if self.string[0] == ")" or self.string[-1] == "(":
+        if self.string and (self.string[0] == ")" or self.string[-1] == "("):
             self.reject_based_on_incorrect_closing_or_opening = True
 
     def check_if_can_reject_based_on_string_length(self):
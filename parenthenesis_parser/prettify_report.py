@@ -11,7 +11,7 @@ def make_line_exact_length(line):
     :rtype: str
     """
     whitespace = TOTAL_LENGTH - len(line) - 3
-    return f'\n- {line}{" " * (whitespace)}-'
+    return f'- {line}{" " * (whitespace)}-'
 
 
 def main(prompt):
@@ -22,11 +22,9 @@ def main(prompt):
     :return: A string, identical to the first, but with a box placed around it.
     :rtype: str
     """
-    output_string = "-" * TOTAL_LENGTH
-    for line in prompt.split("\n"):
-        output_string += make_line_exact_length(line)
-    output_string += "\n" + "-" * TOTAL_LENGTH
-    return output_string
+    border = "-" * TOTAL_LENGTH
+    lines = [make_line_exact_length(line) for line in prompt.split("\n")]
+    return "\n".join([border, *lines, border])
 
 
 def evaluate_if_correct(value, correct_value):
@@ -1,7 +1,20 @@
-from parenthenesis_parser import parser, prettify_report
+import argparse
+import itertools
+import json
+import os
+import sys
 
+from parenthenesis_parser import benchmark, corpus, parser, prettify_report
 
-if __name__ == "__main__":
+
+def demo():
+    """
+    The original write-up: the prompt, how it's solved, and the four examples from the prompt.
+    The examples are run through parse_with_stack, which is the algorithm the write-up explains;
+    parse itself now takes the single-pass path (see parser.is_balanced).
+
+    :return: None
+    """
     prompt = """Prompt:
     
     The parenthesis parsingInput: A string of open and closed parenthesis.
@@ -45,16 +58,16 @@ if __name__ == "__main__":
 
 
     p1 = parser.ParenthesisParser()
-    result1 = p1.parse("(())")  # True
+    result1 = p1.parse_with_stack("(())")  # True
     result_status1 = prettify_report.evaluate_if_correct(result1, True)
 
-    result2 = p1.parse(")()(")  # False
+    result2 = p1.parse_with_stack(")()(")  # False
     result_status2 = prettify_report.evaluate_if_correct(result2, False)
 
-    result3 = p1.parse("()()")  # True
+    result3 = p1.parse_with_stack("()()")  # True
     result_status3 = prettify_report.evaluate_if_correct(result3, True)
 
-    result4 = p1.parse("((())")  # False
+    result4 = p1.parse_with_stack("((())")  # False
     result_status4 = prettify_report.evaluate_if_correct(result4, False)
 
     result = f'''Results: 
@@ -69,3 +82,153 @@ if __name__ == "__main__":
         print(string_to_print + "\n\n")
 
 
+def check(files, batch_size=10000, echo=False):
+    """
+    Checks every line of the files (or of stdin) and writes a verdict for each one to stdout as
+    soon as its batch is done, so it works on an endless stream as well as a file: "True" or
+    "False", a tab, and where the line first fails (see parser.parse_many), followed by the line
+    itself if echo is set. Lines are read as bytes and checked in batches with parse_many. When
+    stdin is a terminal, each line is answered as soon as it's typed.
+
+    :param files: The paths to read, in order. "-" (or no paths at all) reads stdin.
+    :param batch_size: The number of lines that are checked at a time.
+    :param echo: Also write out each line after its verdict.
+    :return: Whether every line was balanced.
+    :rtype: bool
+    """
+    out = sys.stdout.buffer
+    all_balanced = True
+    for path in files or ["-"]:
+        lines_in = sys.stdin.buffer if path == "-" else open(path, "rb")
+        size = 1 if path == "-" and sys.stdin.isatty() else batch_size
+        try:
+            while True:
+                lines = [line.rstrip(b"\r\n") for line in itertools.islice(lines_in, size)]
+                if not lines:
+                    break
+                balanced, offsets = parser.parse_many(lines, return_offsets=True)
+                all_balanced = all_balanced and bool(balanced.all())
+                verdicts = [
+                    b"%s\t%d" % (b"True" if verdict else b"False", offset)
+                    for verdict, offset in zip(balanced.tolist(), offsets.tolist())
+                ]
+                if echo:
+                    verdicts = [b"%s\t%s" % pair for pair in zip(verdicts, lines)]
+                out.write(b"\n".join(verdicts) + b"\n")
+                out.flush()
+        finally:
+            if lines_in is not sys.stdin.buffer:
+                lines_in.close()
+    return all_balanced
+
+
+def generate(args):
+    """
+    Writes a corpus to stdout, one string per line, as it is generated.
+
+    :param args: The parsed arguments of the generate command.
+    :return: None
+    """
+    strings = corpus.generate(
+        args.count,
+        min_length=args.min_length,
+        max_length=args.max_length,
+        nesting=args.nesting,
+        max_depth=args.max_depth,
+        unbalanced=args.unbalanced,
+        seed=args.seed,
+    )
+    out = sys.stdout
+    for batch in iter(lambda: list(itertools.islice(strings, 10000)), []):
+        out.write("\n".join(batch) + "\n")
+
+
+def bench(args):
+    """
+    Benchmarks the parsers on a corpus read from a file, or generated with the same options as
+    the generate command, and prints strings/sec and MB/sec for each.
+
+    :param args: The parsed arguments of the bench command.
+    :return: None
+    """
+    if args.corpus:
+        with open(args.corpus) as f:
+            strings = [line.rstrip("\r\n") for line in f]
+    else:
+        strings = list(corpus.generate(
+            args.count,
+            min_length=args.min_length,
+            max_length=args.max_length,
+            nesting=args.nesting,
+            max_depth=args.max_depth,
+            unbalanced=args.unbalanced,
+            seed=args.seed,
+        ))
+
+    results = benchmark.run_benchmark(
+        strings, implementations=args.implementations, repeat=args.repeat,
+        file_workers=args.workers,
+    )
+    print(benchmark.format_results(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+def add_corpus_arguments(command):
+    command.add_argument("--count", type=int, default=100000, help="Number of strings.")
+    command.add_argument("--min-length", type=int, default=2)
+    command.add_argument("--max-length", type=int, default=100)
+    command.add_argument("--nesting", type=float, default=0.5,
+                         help="Chance of opening rather than closing; higher nests deeper.")
+    command.add_argument("--max-depth", type=int, help="The deepest any string can go.")
+    command.add_argument("--unbalanced", type=float, default=0.5,
+                         help="Share of the strings that are unbalanced.")
+    command.add_argument("--seed", type=int, default=42)
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(
+        description="Check strings of parenthesis. With no command, prints the write-up."
+    )
+    commands = argument_parser.add_subparsers(dest="command")
+
+    check_command = commands.add_parser("check", help="Check each line of files or stdin.")
+    check_command.add_argument("files", nargs="*", help='Files to check; "-" or none for stdin.')
+    check_command.add_argument("--batch-size", type=int, default=10000)
+    check_command.add_argument("--echo", action="store_true",
+                               help="Write each line after its verdict.")
+
+    generate_command = commands.add_parser("generate", help="Write a corpus to stdout.")
+    add_corpus_arguments(generate_command)
+
+    bench_command = commands.add_parser("bench", help="Benchmark the parsers.")
+    add_corpus_arguments(bench_command)
+    bench_command.add_argument("--corpus", help="Read the corpus from a file instead.")
+    bench_command.add_argument("--implementations", nargs="+",
+                               choices=[*benchmark.IMPLEMENTATIONS, "validate_file"])
+    bench_command.add_argument("--repeat", type=int, default=3)
+    bench_command.add_argument("--workers", type=int,
+                               help="Processes for validate_file; defaults to the CPUs.")
+    bench_command.add_argument("--output", help="Where to write the results as JSON.")
+
+    args = argument_parser.parse_args()
+    try:
+        if args.command == "check":
+            if not check(args.files, batch_size=args.batch_size, echo=args.echo):
+                sys.exit(1)
+        elif args.command == "generate":
+            generate(args)
+        elif args.command == "bench":
+            bench(args)
+        else:
+            demo()
+    except BrokenPipeError:
+        # Whatever was reading the output (such as head) has stopped. Point stdout at devnull so
+        # that flushing it on the way out doesn't raise again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
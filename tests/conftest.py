@@ -0,0 +1,32 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, orm
+
+from clock import clock_models as cm
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def make_database(tmp_path, monkeypatch):
+    """
+    Returns a function that creates an empty clock database in the test's temp directory and
+    gives back its engine and session. The SQL files are found relative to the working
+    directory (see config.SQL_PATH), so the test runs from the root of the repository.
+    """
+    monkeypatch.chdir(REPO_ROOT)
+    created = []
+
+    def make(name="clock.db"):
+        engine = create_engine(f"sqlite:///{tmp_path / name}")
+        session = orm.sessionmaker(autoflush=False, bind=engine)()
+        cm.create_models(engine=engine, session=session)
+        created.append((engine, session))
+        return engine, session
+
+    yield make
+
+    for engine, session in created:
+        session.close()
+        engine.dispose()
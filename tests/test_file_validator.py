@@ -0,0 +1,85 @@
+"""
+validate_file splits a file into chunks and the chunks into blocks, so it's checked with both
+made tiny, so that every boundary lands in the middle of the parenthesis, against scanning the
+whole file at once.
+"""
+import random
+
+import pytest
+
+from parenthenesis_parser import file_validator
+from parenthenesis_parser.file_validator import (
+    find_first_violation, summarize_chunk, validate_file
+)
+
+
+def reference(data):
+    """
+    :return: What validate_file should say about the data.
+    :rtype: tuple
+    """
+    depth = 0
+    for i, byte in enumerate(data):
+        depth += 1 if byte == ord("(") else -1 if byte == ord(")") else 0
+        if depth < 0:
+            return False, i
+    return (False, len(data)) if depth else (True, -1)
+
+
+def random_files(seed, count=25):
+    rng = random.Random(seed)
+    files = []
+    for _ in range(count):
+        data = "".join(rng.choice("(()) x\n") for _ in range(rng.randint(1, 120)))
+        # Give most of them a chance of being balanced, or of only going wrong near the end.
+        if rng.random() < 0.5:
+            data = "(" * rng.randint(0, 5) + data.replace(")", "") + ")" * rng.randint(0, 5)
+        files.append(data.encode())
+    return files
+
+
+@pytest.fixture
+def write_file(tmp_path, monkeypatch):
+    # The workers are forked, so they see the small blocks too.
+    monkeypatch.setattr(file_validator, "BLOCK_SIZE", 3)
+    paths = iter(range(10 ** 6))
+
+    def write(data):
+        path = tmp_path / f"{next(paths)}.txt"
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 7, 1024])
+def test_random_files_match_a_reference_scan(write_file, chunk_size):
+    for data in random_files(chunk_size):
+        assert validate_file(write_file(data), workers=2, chunk_size=chunk_size) == \
+            reference(data), data
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b")",
+    b"))))))))",
+    b"(((((((",
+    b"(()())((",
+    b"(()) x (()\n",
+    b"(())())(",
+    b"no parenthesis at all",
+])
+@pytest.mark.parametrize("chunk_size", [1, 5, 1024])
+def test_edge_cases(write_file, data, chunk_size):
+    assert validate_file(write_file(data), workers=2, chunk_size=chunk_size) == reference(data)
+
+
+def test_chunk_summaries_in_process(write_file):
+    # The same, without the process pool, so the small blocks are used whatever way the workers
+    # are started.
+    for data in random_files(99):
+        path = write_file(data)
+        depth, lowest = summarize_chunk(path, 0, len(data))
+        balanced, offset = reference(data)
+        assert (depth == 0 and lowest >= 0) is balanced
+        expected = offset if offset < len(data) else -1
+        assert find_first_violation(path, 0, len(data), 0) == expected
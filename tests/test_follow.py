@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from clock.follow import FollowFile
+
+LINE_LENGTH = len("1,2019-01-01 08:00:00\n")
+
+
+def write_swipes(path, hours, modified_time):
+    with open(path, "w") as f:
+        for hour in hours:
+            f.write(f"1,2019-01-01 {hour:02d}:00:00\n")
+    os.utime(path, (modified_time, modified_time))
+
+
+def test_file_that_doesnt_fit_waits_for_the_next_batch(make_database, tmp_path):
+    # The older file uses up most of the batch, so the newer one can't fit after it, even
+    # though it would fit into a batch of its own.
+    directory = tmp_path / "swipes"
+    directory.mkdir()
+    write_swipes(directory / "a.csv", [8, 9, 10, 11], modified_time=1000)
+    write_swipes(directory / "b.csv", [12], modified_time=2000)
+
+    engine, session = make_database()
+    follow = FollowFile(engine, session, path=str(directory), max_batch_bytes=100,
+                        refresh_reports=False)
+
+    assert follow.follow_once() == 4
+    assert [os.path.basename(path) for _, path, _ in follow.offsets] == ["a.csv"]
+    assert follow.follow_once() == 1
+    assert [os.path.basename(path) for _, path, _ in follow.offsets] == ["b.csv"]
+    assert follow.follow_once() == 0
+
+
+def test_line_longer_than_a_whole_batch(make_database, tmp_path):
+    path = tmp_path / "swipes.csv"
+    write_swipes(path, [8], modified_time=1000)
+
+    engine, session = make_database()
+    follow = FollowFile(engine, session, path=str(path), max_batch_bytes=LINE_LENGTH - 1,
+                        refresh_reports=False)
+
+    with pytest.raises(ValueError, match="longer than max_batch_bytes"):
+        follow.follow_once()
@@ -0,0 +1,88 @@
+"""
+IncrementalParser answers from the summaries in its tree. After every edit, its answers have to
+be the same as those from scanning the whole text again.
+"""
+import random
+
+import pytest
+
+from parenthenesis_parser.incremental import IncrementalParser
+
+
+def scan(text):
+    """
+    :return: Whether the text is balanced, the offset of its first error (as in
+        IncrementalParser.first_error), and its deepest nesting.
+    :rtype: tuple
+    """
+    depth, deepest, error = 0, 0, -1
+    for i, character in enumerate(text):
+        depth += 1 if character == "(" else -1 if character == ")" else 0
+        deepest = max(deepest, depth)
+        if depth < 0 and error == -1:
+            error = i
+    if error == -1 and depth:
+        error = len(text)
+    return error == -1, error, deepest
+
+
+def random_text(rng, length):
+    return "".join(rng.choice("(()) x") for _ in range(length))
+
+
+def assert_matches(parser, text):
+    balanced, error, deepest = scan(text)
+    assert str(parser) == text
+    assert len(parser) == len(text)
+    assert parser.is_balanced() is balanced, text
+    assert parser.first_error() == error, text
+    assert parser.max_depth() == deepest, text
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_random_edits_match_a_full_scan(seed):
+    rng = random.Random(seed)
+    text = random_text(rng, rng.randint(0, 30))
+    parser = IncrementalParser(text)
+    assert_matches(parser, text)
+
+    for _ in range(1000):
+        edit = rng.choice(["insert", "delete", "replace"])
+        index = rng.randint(0, len(text))
+        if edit == "insert":
+            inserted = random_text(rng, rng.randint(0, 8))
+            parser.insert(index, inserted)
+            text = text[:index] + inserted + text[index:]
+        elif edit == "delete":
+            length = rng.randint(0, len(text) - index)
+            parser.delete(index, length)
+            text = text[:index] + text[index + length:]
+        else:
+            replacement = random_text(rng, rng.randint(0, len(text) - index))
+            parser.replace(index, replacement)
+            text = text[:index] + replacement + text[index + len(replacement):]
+        assert_matches(parser, text)
+
+
+def test_deleting_everything():
+    parser = IncrementalParser("(()")
+    parser.delete(0, 3)
+    assert_matches(parser, "")
+    parser.insert(0, ")(")
+    assert_matches(parser, ")(")
+
+
+@pytest.mark.parametrize("edit, args", [
+    ("insert", (-1, "(")),
+    ("insert", (5, "(")),
+    ("delete", (-1,)),
+    ("delete", (4, 2)),
+    ("delete", (2, -3)),
+    ("replace", (-1, "(")),
+    ("replace", (3, "((")),
+])
+def test_index_outside_of_the_text(edit, args):
+    parser = IncrementalParser("(())")
+    with pytest.raises(IndexError):
+        getattr(parser, edit)(*args)
+    assert_matches(parser, "(())")
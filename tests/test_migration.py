@@ -0,0 +1,111 @@
+"""
+A database from before times and dates were stored as integers, and before a swipe could only be
+stored once, has to come out of create_models and the next transform the same as if its file
+had been loaded into a new database.
+"""
+import datetime
+import itertools
+import sqlite3
+
+import pandas as pd
+
+from clock.c_transform_clock_data import Transform
+from clock.staging_loader import StagingLoader
+from test_report_queries import assert_rollups_match_reference
+from test_sessionize import SWIPES, read_table
+
+# The tables as they were, with the text types that SQLAlchemy gave DATE and TIMESTAMP columns
+# and no unique index on clock_ins. attendance was one of the rollups, keyed by the year as
+# text.
+OLD_SCHEMA = """
+CREATE TABLE clock_ins (
+    employee_id INTEGER NOT NULL, report_date DATE NOT NULL, clock_in_number INTEGER NOT NULL,
+    clock_time TIMESTAMP, PRIMARY KEY (employee_id, report_date, clock_in_number)
+);
+CREATE TABLE employee_daily_report (
+    employee_id INTEGER NOT NULL, report_date DATE NOT NULL, start_time TIMESTAMP,
+    end_time TIMESTAMP, total_floor_time_seconds INTEGER, PRIMARY KEY (employee_id, report_date)
+);
+CREATE TABLE dirty_partitions (
+    employee_id INTEGER NOT NULL, report_date DATE NOT NULL,
+    PRIMARY KEY (employee_id, report_date)
+);
+CREATE TABLE attendance (
+    employee_id INTEGER NOT NULL, report_year TEXT NOT NULL, total_days INTEGER,
+    PRIMARY KEY (employee_id, report_year)
+);
+"""
+
+# A day that comes after the old database was last loaded.
+NEXT_FILE = [(3, "2019-01-05 09:00:00"), (3, "2019-01-05 17:00:00")]
+
+
+def write_old_database(path, swipes):
+    """
+    Store the swipes the way the old transform did: every swipe in the file numbered in order,
+    so a swipe that was in the file twice is stored twice and counted in its day's floor time.
+    """
+    clock_ins, reports, attendance = [], [], {}
+    swipes = sorted(swipes)
+    for (employee_id, report_date), day in itertools.groupby(swipes, lambda s: (s[0], s[1][:10])):
+        times = [clock_time for _, clock_time in day]
+        clock_ins += [
+            (employee_id, report_date, number, clock_time)
+            for number, clock_time in enumerate(times, 1)
+        ]
+        seconds = [datetime.datetime.fromisoformat(time).timestamp() for time in times]
+        pairs = list(zip(seconds[::2], seconds[1::2]))
+        floor_time = int(sum(end - start for start, end in pairs)) if pairs else None
+        reports.append((employee_id, report_date, times[0], times[-1], floor_time))
+        key = (employee_id, report_date[:4])
+        attendance[key] = attendance.get(key, 0) + 1
+
+    connection = sqlite3.connect(path)
+    connection.executescript(OLD_SCHEMA)
+    connection.executemany("insert into clock_ins values (?, ?, ?, ?);", clock_ins)
+    connection.executemany("insert into employee_daily_report values (?, ?, ?, ?, ?);", reports)
+    connection.executemany("insert into attendance values (?, ?, ?);",
+                           [key + (days,) for key, days in attendance.items()])
+    connection.commit()
+    connection.close()
+
+
+def count_rows(engine, table):
+    return pd.read_sql_query(f"select count(*) as rows from {table};", con=engine)["rows"][0]
+
+
+def load(engine, session, rows):
+    StagingLoader(engine).load([rows])
+    transform = Transform(engine, session)
+    transform.import_clock_times()
+    transform.run_report_queries()
+
+
+def test_old_database_matches_a_new_one(make_database, tmp_path):
+    write_old_database(tmp_path / "old.db", SWIPES)
+    old_engine, old_session = make_database("old.db")
+
+    new_engine, new_session = make_database("new.db")
+    load(new_engine, new_session, SWIPES)
+
+    # The duplicate is gone before anything is loaded, and the day it was on is numbered again.
+    clock_ins = read_table(old_engine, "clock_ins")
+    pd.testing.assert_frame_equal(clock_ins, read_table(new_engine, "clock_ins"))
+
+    # Every day's report was converted as it was. The one with the duplicate is still wrong
+    # until the next transform, but it's dirty, and so is every other day, as the outdated
+    # rollups were dropped and have to be rebuilt from all of it.
+    old_reports = read_table(old_engine, "employee_daily_report")
+    new_reports = read_table(new_engine, "employee_daily_report")
+    different = ((old_reports != new_reports) & new_reports.notna()).any(axis=1)
+    assert old_reports[different][["employee_id", "report_date"]].values.tolist() == \
+        [[2, datetime.date(2019, 1, 1).toordinal() - datetime.date(1970, 1, 1).toordinal()]]
+    assert count_rows(old_engine, "dirty_partitions") == len(new_reports)
+
+    load(old_engine, old_session, NEXT_FILE)
+    load(new_engine, new_session, NEXT_FILE)
+
+    for table in ("clock_ins", "employee_daily_report"):
+        pd.testing.assert_frame_equal(read_table(old_engine, table), read_table(new_engine, table))
+    assert_rollups_match_reference(old_engine)
+    assert count_rows(old_engine, "dirty_partitions") == 0
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+from parenthenesis_parser.parser import ParenthesisParser, is_balanced, parse_many
+
+
+def first_error(string):
+    """
+    The reference scan: the index of the first ")" with nothing to close, the length of the
+    string if it ends with unclosed "(", or -1 if it's balanced.
+    """
+    depth = 0
+    for i, character in enumerate(string):
+        depth += 1 if character == "(" else -1 if character == ")" else 0
+        if depth < 0:
+            return i
+    return len(string) if depth else -1
+
+
+def random_strings(seed, count=2000, characters="(()) x"):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(characters) for _ in range(rng.randint(0, 20)))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_is_balanced_agrees_on_every_kind_of_input(seed):
+    parser = ParenthesisParser()
+    for string in random_strings(seed):
+        expected = first_error(string) == -1
+        encoded = string.encode()
+        assert is_balanced(string) is expected, string
+        assert is_balanced(encoded) is expected, string
+        assert is_balanced(bytearray(encoded)) is expected, string
+        assert is_balanced(memoryview(encoded)) is expected, string
+        assert parser.parse(string) is expected, string
+        assert parser.parse_with_stack(string) is expected, string
+
+
+def test_closing_with_nothing_to_close_in_the_middle():
+    # Even, as many opens as closes, and starts with "(" and ends with ")", so it gets past
+    # every quick rejection and used to raise an IndexError from the stack.
+    parser = ParenthesisParser()
+    assert not is_balanced("())(()")
+    assert not parser.parse("())(()")
+    assert not parser.parse_with_stack("())(()")
+
+
+def test_empty_string_is_balanced():
+    parser = ParenthesisParser()
+    assert is_balanced("")
+    assert is_balanced(b"")
+    assert parser.parse("")
+    assert parser.parse_with_stack("")
+    assert parser.parse_with_stack("no parenthesis at all")
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_parse_many_offsets(seed):
+    strings = random_strings(seed)
+    balanced, offsets = parse_many(strings, return_offsets=True)
+
+    assert balanced.tolist() == [is_balanced(string) for string in strings]
+    assert offsets.tolist() == [first_error(string) for string in strings]
+    assert parse_many(strings).tolist() == balanced.tolist()
+
+
+def test_parse_many_offsets_contract():
+    balanced, offsets = parse_many(["(())", ")()(", "((())", "(()))(", "", "(("],
+                                   return_offsets=True)
+    assert balanced.tolist() == [True, False, False, False, True, False]
+    assert offsets.tolist() == [-1, 0, 5, 4, -1, 2]
+
+
+def test_parse_many_takes_bytes_and_arrays():
+    strings = random_strings(3)
+    expected = parse_many(strings, return_offsets=True)
+    for batch in ([string.encode() for string in strings], np.array(strings, dtype=object),
+                  iter(strings)):
+        balanced, offsets = parse_many(batch, return_offsets=True)
+        assert balanced.tolist() == expected[0].tolist()
+        assert offsets.tolist() == expected[1].tolist()
+
+
+def test_parse_many_with_no_strings():
+    balanced, offsets = parse_many([], return_offsets=True)
+    assert balanced.tolist() == [] and offsets.tolist() == []
+    assert parse_many([]).tolist() == []
+
+
+def test_parse_many_offsets_are_into_the_original_str():
+    # Every character that isn't ASCII counts as one "?", so the offsets are still offsets into
+    # the str rather than into its UTF-8 bytes.
+    strings = ["é(ü))", "(日本)", "((ß", "ñ)"]
+    balanced, offsets = parse_many(strings, return_offsets=True)
+    assert balanced.tolist() == [is_balanced(string) for string in strings]
+    assert offsets.tolist() == [first_error(string) for string in strings] == [4, -1, 3, 1]
@@ -0,0 +1,142 @@
+"""
+report_queries.sql keeps the rollups up to date by adding each dirty day's change to them. After
+any sequence of loads, they have to be the same as rollups computed from scratch from
+employee_daily_report, which is what REFERENCE_QUERIES do.
+"""
+import datetime
+import random
+
+import pandas as pd
+import pytest
+
+from clock.c_transform_clock_data import Transform
+from clock.staging_loader import StagingLoader
+
+YEAR = "cast(strftime('%Y', report_date * 86400, 'unixepoch') as integer)"
+WEEK = "report_date - (report_date + 3) % 7"
+MONTH = (
+    "cast(strftime('%s', report_date * 86400, 'unixepoch', 'start of month') as integer) / 86400"
+)
+
+REFERENCE_QUERIES = {
+    "total_annual_floor_time": f"""
+        select employee_id, {YEAR} as report_year
+             , sum(total_floor_time_seconds) as yearly_floor_time
+             , count(total_floor_time_seconds) as floor_time_days
+        from employee_daily_report
+        group by 1, 2
+    """,
+    "attendance": f"""
+        select employee_id, {YEAR} as report_year, count(*) as total_days
+        from employee_daily_report
+        group by 1, 2
+    """,
+    "monthly_aggregate": f"""
+        select {MONTH} as month_start
+             , avg(total_floor_time_seconds) as average_floor_time_seconds
+             , sum(total_floor_time_seconds) as total_floor_time_seconds
+             , min(total_floor_time_seconds) as min_floor_time_seconds
+             , max(total_floor_time_seconds) as max_floor_time_seconds
+             , count(total_floor_time_seconds) as floor_time_days
+        from employee_daily_report
+        group by 1
+    """,
+    "weekly_aggregate": f"""
+        select {WEEK} as week_start
+             , avg(total_floor_time_seconds) as average_floor_time_seconds
+             , sum(total_floor_time_seconds) as total_floor_time_seconds
+             , min(total_floor_time_seconds) as min_floor_time_seconds
+             , max(total_floor_time_seconds) as max_floor_time_seconds
+             , count(total_floor_time_seconds) as floor_time_days
+        from employee_daily_report
+        group by 1
+    """,
+    "best_worst_25": f"""
+        with totals as (
+            select employee_id, {YEAR} as report_year
+                 , sum(total_floor_time_seconds) as yearly_floor_time
+            from employee_daily_report
+            group by 1, 2
+        ), ranked as (
+            select employee_id, report_year, yearly_floor_time
+                 , row_number() over (partition by report_year
+                                      order by yearly_floor_time desc, employee_id) as rank_best
+                 , row_number() over (partition by report_year
+                                      order by yearly_floor_time, employee_id) as rank_worst
+            from totals
+        )
+        select employee_id, report_year
+             , yearly_floor_time as yearly_floor_time_seconds
+             , yearly_floor_time / 60 / 60 as yearly_floor_time_hours
+             , rank_best, rank_worst
+        from ranked
+        where rank_best <= 25 or rank_worst <= 25
+    """,
+}
+
+
+def random_swipes(seed, employees=40, days=45):
+    """
+    A few swipes per employee/day over a span that crosses months and a new year, with the odd
+    day of a single swipe (no floor time) thrown in. One more employee never has more than one
+    swipe a day, so their totals are NULL.
+    """
+    rng = random.Random(seed)
+    first_day = datetime.datetime(2018, 12, 10)
+    swipes = []
+    for employee_id in range(1, employees + 1):
+        for day in range(days):
+            if rng.random() < 0.2:
+                continue
+            midnight = first_day + datetime.timedelta(days=day)
+            seconds = rng.sample(range(6 * 3600, 20 * 3600), rng.choice([1, 2, 2, 3, 4, 6, 8]))
+            swipes += [
+                (employee_id, str(midnight + datetime.timedelta(seconds=second)))
+                for second in seconds
+            ]
+    swipes += [
+        (employees + 1, str(first_day + datetime.timedelta(days=day, hours=9)))
+        for day in range(0, days, 3)
+    ]
+    rng.shuffle(swipes)
+    return swipes
+
+
+def load(engine, session, rows, refresh_reports=True):
+    StagingLoader(engine).load([rows])
+    transform = Transform(engine, session)
+    transform.import_clock_times()
+    if refresh_reports:
+        transform.run_report_queries()
+
+
+def assert_rollups_match_reference(engine):
+    for table, query in REFERENCE_QUERIES.items():
+        expected = pd.read_sql_query(f"{query} order by 1, 2;", con=engine)
+        actual = pd.read_sql_query(
+            f"select {', '.join(expected.columns)} from {table} order by 1, 2;", con=engine
+        )
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, obj=table)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_rollups_match_a_rebuild_after_partial_loads(make_database, seed):
+    engine, session = make_database()
+    swipes = random_swipes(seed)
+    rng = random.Random(seed)
+    batches = [swipes[i::4] for i in range(4)]
+
+    # The first batch on its own, the next two (partial days, and swipes before the ones that
+    # are stored) without refreshing the reports in between, then the last one along with some
+    # swipes that are already stored.
+    load(engine, session, batches[0])
+    assert_rollups_match_reference(engine)
+    load(engine, session, batches[1], refresh_reports=False)
+    load(engine, session, batches[2])
+    assert_rollups_match_reference(engine)
+    load(engine, session, batches[3] + rng.sample(batches[0], 50))
+    assert_rollups_match_reference(engine)
+
+    # Loading everything again changes nothing.
+    load(engine, session, swipes)
+    assert_rollups_match_reference(engine)
@@ -0,0 +1,118 @@
+"""
+The pandas engine (clock.sessionize.Sessionize) has to produce the same clock_ins and
+employee_daily_report as insert_clock_times.sql. Each test loads the same staging rows into a
+database through each method and compares the tables.
+"""
+import pandas as pd
+import pytest
+
+from clock.c_transform_clock_data import Transform
+from clock.staging_loader import StagingLoader
+
+SWIPES = [
+    # An odd number of swipes: the last clock in has no clock out.
+    (1, "2019-01-01 08:00:00"),
+    (1, "2019-01-01 12:00:00"),
+    (1, "2019-01-01 13:00:00"),
+    # More than 6 swipes in a day.
+    (1, "2019-01-02 06:00:00"),
+    (1, "2019-01-02 07:00:00"),
+    (1, "2019-01-02 08:00:00"),
+    (1, "2019-01-02 09:30:00"),
+    (1, "2019-01-02 10:00:00"),
+    (1, "2019-01-02 11:15:00"),
+    (1, "2019-01-02 12:00:00"),
+    (1, "2019-01-02 17:45:00"),
+    # Either side of midnight, which are two different days.
+    (1, "2019-01-03 22:00:00"),
+    (1, "2019-01-03 23:59:59"),
+    (1, "2019-01-04 00:00:01"),
+    (1, "2019-01-04 02:00:00"),
+    # A swipe that is in the file twice.
+    (2, "2019-01-01 09:00:00"),
+    (2, "2019-01-01 12:30:00"),
+    (2, "2019-01-01 12:30:00"),
+    (2, "2019-01-01 13:00:00"),
+    (2, "2019-01-01 17:00:00"),
+    # A single swipe, so there's no floor time at all.
+    (2, "2019-01-02 09:00:00"),
+    # Out of order in the file.
+    (3, "2019-01-01 17:00:00"),
+    (3, "2019-01-01 09:00:00"),
+]
+
+
+def load(engine, session, rows, method):
+    StagingLoader(engine).load([rows])
+    Transform(engine, session, method=method).import_clock_times()
+
+
+def read_table(engine, table):
+    return pd.read_sql_query(f"select * from {table} order by 1, 2, 3;", con=engine)
+
+
+def assert_same_tables(first, second):
+    for table in ("clock_ins", "employee_daily_report"):
+        pd.testing.assert_frame_equal(read_table(first, table), read_table(second, table))
+
+
+@pytest.fixture
+def databases(make_database):
+    return make_database("sql.db"), make_database("pandas.db")
+
+
+def test_engines_match(databases):
+    (sql_engine, sql_session), (pandas_engine, pandas_session) = databases
+    load(sql_engine, sql_session, SWIPES, "sql")
+    load(pandas_engine, pandas_session, SWIPES, "pandas")
+
+    assert_same_tables(sql_engine, pandas_engine)
+
+    clock_ins = read_table(sql_engine, "clock_ins")
+    assert len(clock_ins) == len(set(SWIPES))
+    assert clock_ins.groupby(["employee_id", "report_date"])["clock_in_number"].max().max() == 8
+
+    daily_report = read_table(sql_engine, "employee_daily_report").set_index(
+        ["employee_id", "report_date"]
+    )["total_floor_time_seconds"]
+    assert daily_report.iloc[0] == 4 * 60 * 60
+    assert daily_report.isna().sum() == 1
+
+
+def test_reingest_changes_nothing(databases, make_database):
+    (sql_engine, sql_session), (pandas_engine, pandas_session) = databases
+    for _ in range(2):
+        load(sql_engine, sql_session, SWIPES, "sql")
+        load(pandas_engine, pandas_session, SWIPES, "pandas")
+
+    once_engine, once_session = make_database("once.db")
+    load(once_engine, once_session, SWIPES, "sql")
+
+    assert_same_tables(sql_engine, pandas_engine)
+    assert_same_tables(sql_engine, once_engine)
+
+
+def test_partial_day_across_two_loads(databases):
+    (sql_engine, sql_session), (pandas_engine, pandas_session) = databases
+    # The second load has swipes both before and after the ones that were already stored.
+    first_load = [swipe for swipe in SWIPES if swipe[1][11:13] in ("08", "09", "10")]
+    second_load = [swipe for swipe in SWIPES if swipe not in first_load]
+    load(sql_engine, sql_session, first_load, "sql")
+    load(sql_engine, sql_session, second_load, "sql")
+    load(pandas_engine, pandas_session, SWIPES, "pandas")
+
+    assert_same_tables(sql_engine, pandas_engine)
+
+
+def test_pandas_refuses_partial_days(make_database):
+    engine, session = make_database()
+    first_load = [swipe for swipe in SWIPES if swipe[1] < "2019-01-01 12:00:00"]
+    load(engine, session, first_load, "pandas")
+    before = {table: read_table(engine, table)
+              for table in ("clock_ins", "employee_daily_report")}
+
+    with pytest.raises(ValueError, match="whole days"):
+        load(engine, session, SWIPES, "pandas")
+
+    for table, rows in before.items():
+        pd.testing.assert_frame_equal(read_table(engine, table), rows)
@@ -0,0 +1,75 @@
+"""
+ShardedTransform has to leave clock_ins, employee_daily_report, and dirty_partitions exactly as
+insert_clock_times.sql does on its own, over loads that add new days, add to the end of stored
+days, and add swipes in the middle of stored days.
+"""
+import random
+
+import pandas as pd
+import pytest
+
+from clock.c_transform_clock_data import Transform
+from clock.staging_loader import StagingLoader
+from test_report_queries import random_swipes
+from test_sessionize import SWIPES, read_table
+
+
+def load(engine, session, rows, method, workers=None):
+    StagingLoader(engine).load([rows])
+    Transform(engine, session, method=method, workers=workers).import_clock_times()
+
+
+def read_tables(engine):
+    return {
+        "clock_ins": read_table(engine, "clock_ins"),
+        "employee_daily_report": read_table(engine, "employee_daily_report"),
+        "dirty_partitions": pd.read_sql_query(
+            "select * from dirty_partitions order by 1, 2;", con=engine
+        ),
+    }
+
+
+def assert_same_tables(first, second):
+    for table, rows in read_tables(first).items():
+        pd.testing.assert_frame_equal(read_tables(second)[table], rows, obj=table)
+
+
+def batches(swipes, seed):
+    """
+    The swipes split in time order, so each load mostly adds to the end of the days, with a
+    few swipes held back to a later load, so that they land before ones already stored.
+    """
+    rng = random.Random(seed)
+    swipes = sorted(swipes, key=lambda swipe: swipe[1])
+    late = set(rng.sample(range(len(swipes)), len(swipes) // 10))
+    on_time = [swipe for i, swipe in enumerate(swipes) if i not in late]
+    held_back = [swipe for i, swipe in enumerate(swipes) if i in late]
+    size = len(on_time) // 3 + 1
+    loads = [on_time[i:i + size] for i in range(0, len(on_time), size)]
+    return loads[:2] + [loads[2] + held_back]
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_sharded_matches_sql(make_database, workers):
+    sql_engine, sql_session = make_database("sql.db")
+    sharded_engine, sharded_session = make_database("sharded.db")
+
+    loads = batches(random_swipes(workers, employees=10, days=10), seed=workers)
+    # The last load is done twice, the second time with nothing new in it.
+    for rows in [SWIPES] + loads + loads[-1:]:
+        load(sql_engine, sql_session, rows, "sql")
+        load(sharded_engine, sharded_session, rows, "sharded", workers=workers)
+        assert_same_tables(sql_engine, sharded_engine)
+
+
+def test_sharded_full_refresh_changes_nothing(make_database):
+    engine, session = make_database()
+    load(engine, session, SWIPES, "sharded", workers=2)
+    before = read_tables(engine)
+
+    StagingLoader(engine).load([[]])
+    Transform(engine, session, full_refresh=True, method="sharded", workers=2) \
+        .import_clock_times()
+
+    for table in ("clock_ins", "employee_daily_report"):
+        pd.testing.assert_frame_equal(read_tables(engine)[table], before[table], obj=table)
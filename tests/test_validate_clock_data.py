@@ -0,0 +1,103 @@
+"""
+ValidateStaging has to quarantine exactly the employee/days that break each rule, with the
+reasons, and leave every other swipe in the staging table for the transform.
+"""
+import pandas as pd
+import pytest
+
+from clock import instrumentation
+from clock.staging_loader import StagingLoader
+from clock.validate_clock_data import ValidateStaging
+
+FLAGGED = {
+    # Three swipes, so the last clock in has no clock out.
+    (1, "2019-01-01"): ["08:00:00", "12:00:00", "13:00:00"],
+    (2, "2019-01-01"): ["09:00:00", "12:00:00", "12:00:00", "17:00:00"],
+    (3, "2019-01-01"): ["09:00:00", "09:00:30", "12:00:00", "17:00:00"],
+    # A shift from 22:00 to 06:00 the next morning.
+    (4, "2019-01-01"): ["09:00:00", "12:00:00", "22:00:00"],
+    (4, "2019-01-02"): ["06:00:00"],
+    # Not in the employee table.
+    (5, "2019-01-01"): ["09:00:00", "17:00:00"],
+}
+REASONS = {
+    (1, "2019-01-01"): "odd_swipe_count",
+    (2, "2019-01-01"): "duplicate_swipe",
+    (3, "2019-01-01"): "overlapping_swipe",
+    (4, "2019-01-01"): "odd_swipe_count,crosses_midnight",
+    (4, "2019-01-02"): "odd_swipe_count,crosses_midnight",
+    (5, "2019-01-01"): "unknown_employee",
+}
+CLEAN = {
+    (1, "2019-01-03"): ["08:00:00", "17:00:00"],
+    # Right at the start of the day after a quarantined one.
+    (4, "2019-01-03"): ["00:00:00", "08:00:00"],
+    (6, "2019-01-01"): ["09:00:00", "17:00:00"],
+}
+RULE_COUNTS = {
+    "odd_swipe_count": 3,
+    "duplicate_swipe": 1,
+    "overlapping_swipe": 1,
+    "crosses_midnight": 2,
+    "unknown_employee": 1,
+}
+
+
+def swipes(days):
+    return [
+        (employee_id, f"{report_date} {time}")
+        for (employee_id, report_date), times in days.items()
+        for time in times
+    ]
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    records = []
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION", True)
+    monkeypatch.setattr(instrumentation, "_record", records.append)
+    return records
+
+
+def test_each_rule_is_quarantined(make_database, spans):
+    engine, session = make_database()
+    session.execute("insert into employee (employee_id) values (1), (2), (3), (4), (6);")
+    session.commit()
+    StagingLoader(engine).load([swipes({**FLAGGED, **CLEAN})])
+
+    ValidateStaging(engine, session, known_employees_only=True).execute()
+
+    quarantine = pd.read_sql_query(
+        "select employee_id, report_date, clock_time, reasons from clock_quarantine "
+        "order by employee_id, clock_time;",
+        con=engine,
+    )
+    assert list(quarantine[["employee_id", "clock_time"]].itertuples(index=False, name=None)) \
+        == sorted(swipes(FLAGGED))
+    assert {
+        (employee_id, report_date): reasons
+        for employee_id, report_date, reasons
+        in quarantine[["employee_id", "report_date", "reasons"]].itertuples(index=False)
+    } == REASONS
+
+    staging = pd.read_sql_query(
+        "select employee_id, clock_time from clock_staging order by employee_id, clock_time;",
+        con=engine,
+    )
+    assert list(staging.itertuples(index=False, name=None)) == sorted(swipes(CLEAN))
+
+    assert {
+        record["labels"]["rule"]: record["rows"]
+        for record in spans if record["span"] == "quarantine_rule"
+    } == RULE_COUNTS
+
+
+def test_clean_staging_table_is_left_alone(make_database):
+    engine, session = make_database()
+    StagingLoader(engine).load([swipes(CLEAN)])
+
+    ValidateStaging(engine, session).execute()
+
+    assert pd.read_sql_query("select * from clock_quarantine;", con=engine).empty
+    staging = pd.read_sql_query("select employee_id, clock_time from clock_staging;", con=engine)
+    assert len(staging) == len(swipes(CLEAN))
@@ -1,4 +1,6 @@
-from clock import a_fake_clock_data, b_import_clock_data, c_transform_clock_data
+from clock import (
+    a_fake_clock_data, b_import_clock_data, c_transform_clock_data, validate_clock_data
+)
 
 
 """
@@ -33,4 +35,5 @@ if __name__ == '__main__':
     a_fake_clock_data.main()
 
     b_import_clock_data.main()
+    validate_clock_data.main()
     c_transform_clock_data.main()
\ No newline at end of file